@@ -0,0 +1,99 @@
+"""Flask CLI commands (run with `flask <command>`)"""
+
+import io
+import os
+import click
+from app.models import db, recount_levels, refresh_addresses
+from app.services.pool import statement_timeout
+
+
+def register_commands(app):
+    @app.cli.command('recount')
+    def recount_command():
+        """Rebuild the denormalized count, occupancy and address columns"""
+        statement_timeout(0)  # whole-table rebuild, not bound by the request limit
+        recount_levels()
+        refresh_addresses()
+        db.session.commit()
+        print('Counters and addresses rebuilt')
+
+    @app.cli.command('import-data')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension')
+    @click.option('--batch-size', type=int, default=None, help='Rows per transaction')
+    def import_command(path, fmt, batch_size):
+        """Stream items, placements and hierarchy from a CSV or JSONL file"""
+        from app.services.importer import import_stream, DEFAULT_BATCH_SIZE
+
+        fmt = fmt or format_from_filename(path)
+        if fmt is None:
+            raise click.UsageError('Cannot tell the format from the file name, pass --format')
+
+        def progress(report):
+            print(f'  {report.rows} rows, {report.items} items, {report.failed} failed '
+                  f'({report.rows_per_second:.0f} rows/s)')
+
+        with io.open(path, encoding='utf-8', newline='') as stream:
+            report = import_stream(stream, fmt, batch_size or DEFAULT_BATCH_SIZE, progress)
+
+        print(f"Imported {report.modules} modules, {report.levels} levels, "
+              f"{report.items} items and {report.placements} placements "
+              f"from {report.rows} rows in {report.elapsed:.1f}s")
+        for error in report.errors:
+            print(f"  line {error['line']}: {error['error']}")
+        if report.failed > len(report.errors):
+            print(f'  ... {report.failed - len(report.errors)} more errors')
+
+    @app.cli.command('generate-data')
+    @click.option('--preset', type=click.Choice(['tiny', 'small', 'medium', 'large']), default='small')
+    @click.option('--modules', type=int, help='Override the preset')
+    @click.option('--levels', type=int, help='Levels per module')
+    @click.option('--rows', type=int)
+    @click.option('--columns', type=int)
+    @click.option('--items', type=int)
+    @click.option('--seed', type=int, default=0)
+    def generate_command(preset, modules, levels, rows, columns, items, seed):
+        """Fill the database with a synthetic dataset for benchmarking"""
+        from app.services.dataset import generate, PRESETS
+
+        defaults = PRESETS[preset]
+        sizes = [value if value is not None else default for value, default in
+                 zip((modules, levels, rows, columns, items), defaults)]
+        summary = generate(*sizes, seed=seed, progress=lambda message: print(f'  {message}'))
+        print(f"Generated {summary['modules']} modules, {summary['levels']} levels, "
+              f"{summary['locations']} locations and {summary['items']} items in {summary['seconds']}s")
+
+    @app.cli.command('find-duplicates')
+    @click.option('--threshold', type=float, default=None, help='Estimated similarity, 0-1')
+    @click.option('--min-size', type=int, default=2, help='Smallest group to report')
+    @click.option('--limit', type=int, default=50, help='Groups to print')
+    def find_duplicates_command(threshold, min_size, limit):
+        """Report groups of near-duplicate items"""
+        from app.models import Item
+        from app.services.duplicate_detection import index, THRESHOLD
+
+        clusters = index.clusters(threshold or THRESHOLD, min_size)
+        print(f'{len(clusters)} groups, {sum(len(c) for c in clusters)} items')
+        shown = clusters[:limit]
+        names = dict(
+            db.session.query(Item.id, Item.name).filter(Item.id.in_([i for c in shown for i in c]))
+        ) if shown else {}
+        for cluster in shown:
+            print(f'  {len(cluster)} items: ' + ', '.join(f'#{i} {names.get(i)}' for i in cluster[:10])
+                  + (' ...' if len(cluster) > 10 else ''))
+
+    @app.cli.command('similar-items')
+    def similar_items_command():
+        """Recompute every item's similar items (run after bulk imports)"""
+        from app.services import similar_items
+
+        statement_timeout(0)
+        items, documents = similar_items.index.rebuild()
+        db.session.commit()
+        print(f'Stored similar items for {items} items ({documents} distinct descriptions)')
+
+
+def format_from_filename(filename):
+    """Import/export format for a file name, or None"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(extension)
@@ -0,0 +1,251 @@
+"""
+Per-request SQL profiling and Prometheus metrics.
+
+Every request served by the app, whatever blueprint it belongs to, records
+its latency, the number of SQL statements it ran and their total time.
+Statements are fingerprinted (parameters and IN lists collapsed); when one
+fingerprint runs N_PLUS_ONE_THRESHOLD or more times in a request, the
+request is counted as an N+1 and logged with the statement, which is how
+lazy loads inside loops show up.
+
+- ``GET /metrics``: Prometheus text format, including the database pool
+- ``GET /api/profiling``: per-endpoint averages and recent N+1 statements
+- ``PROFILE_HEADERS=1``: adds ``X-Query-Count`` and a ``Server-Timing``
+  header to every response, which browser dev tools display
+
+Metrics are kept per worker process; scrape each worker or accept that a
+scrape samples one of them.
+"""
+
+import re
+import threading
+import time
+from collections import defaultdict, deque, Counter
+from flask import Response, current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.models import db
+from app.services.pool import Histogram, InstrumentedQueuePool
+
+N_PLUS_ONE_THRESHOLD = 5
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+# Upper bounds in seconds: whole requests, and the SQL time within one
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+RECENT_N_PLUS_ONE = 50
+
+_PARAMETER = r'(?:\?|%\(\w+\)s|:\w+|\$\d+)'
+_IN_LIST = re.compile(r'\(\s*' + _PARAMETER + r'(?:\s*,\s*' + _PARAMETER + r')*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Statement text with whitespace, numbers and parameter lists normalized"""
+    statement = _SPACE.sub(' ', statement).strip()
+    statement = _IN_LIST.sub('(?)', statement)
+    return _NUMBER.sub('N', statement)
+
+
+class Metrics:
+    """Per-process request and query metrics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()  # (endpoint, method, status) -> count
+        self.latency = defaultdict(lambda: Histogram(REQUEST_BUCKETS))
+        self.query_counts = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(lambda: Histogram(DB_SECONDS_BUCKETS))
+        self.n_plus_one = Counter()
+        self.recent_n_plus_one = deque(maxlen=RECENT_N_PLUS_ONE)
+
+    def record(self, endpoint, path, method, status, seconds, queries, db_seconds, repeated):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            if repeated:
+                self.n_plus_one[endpoint] += 1
+                for statement, count in repeated:
+                    self.recent_n_plus_one.append({
+                        'endpoint': endpoint,
+                        'path': path,
+                        'count': count,
+                        'statement': statement,
+                    })
+            latency = self.latency[endpoint]
+            query_counts = self.query_counts[endpoint]
+            db_time = self.db_seconds[endpoint]
+        latency.observe(seconds)
+        query_counts.observe(queries)
+        db_time.observe(db_seconds)
+
+    def summary(self):
+        with self._lock:
+            endpoints = sorted(self.latency)
+            return {
+                'endpoints': {
+                    endpoint: {
+                        'requests': self.latency[endpoint].count,
+                        'avg_ms': round(1000 * self.latency[endpoint].total / max(self.latency[endpoint].count, 1), 2),
+                        'max_ms': round(1000 * self.latency[endpoint].max, 2),
+                        'avg_queries': round(self.query_counts[endpoint].total / max(self.query_counts[endpoint].count, 1), 2),
+                        'max_queries': self.query_counts[endpoint].max,
+                        'db_seconds': round(self.db_seconds[endpoint].total, 6),
+                        'n_plus_one': self.n_plus_one[endpoint],
+                    }
+                    for endpoint in endpoints
+                },
+                'recent_n_plus_one': list(self.recent_n_plus_one),
+            }
+
+
+metrics = Metrics()
+
+
+# SQL timing
+
+# The start time lives on the statement's execution context rather than the
+# connection, so a statement that raises leaves nothing behind on a pooled
+# connection.
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None or not has_request_context():
+        return
+    elapsed = time.perf_counter() - started
+    profile = g.get('sql_profile')
+    if profile is not None:
+        profile['count'] += 1
+        profile['seconds'] += elapsed
+        profile['statements'][fingerprint(statement)] += 1
+
+
+# Request hooks
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.sql_profile = {'count': 0, 'seconds': 0.0, 'statements': Counter()}
+
+
+def _finish_request(response):
+    profile = g.pop('sql_profile', None)
+    started = g.pop('request_started', None)
+    if profile is None or started is None:
+        return response
+
+    endpoint = request.endpoint or 'unmatched'
+    elapsed = time.perf_counter() - started
+    repeated = [
+        (statement, count) for statement, count in profile['statements'].most_common()
+        if count >= N_PLUS_ONE_THRESHOLD
+    ]
+    metrics.record(endpoint, request.path, request.method, response.status_code, elapsed,
+                   profile['count'], profile['seconds'], repeated)
+    for statement, count in repeated:
+        current_app.logger.warning('Possible N+1 in %s: %d x %s', endpoint, count, statement[:300])
+
+    if g.get('profile_headers'):
+        response.headers['X-Query-Count'] = str(profile['count'])
+        response.headers['Server-Timing'] = (
+            f'db;dur={profile["seconds"] * 1000:.2f};desc="{profile["count"]} queries", '
+            f'app;dur={elapsed * 1000:.2f}'
+        )
+        if repeated:
+            response.headers['X-N-Plus-One'] = str(len(repeated))
+    return response
+
+
+# Prometheus exposition
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{k}="{_label_value(v)}"' for k, v in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, **labels):
+    data = histogram.to_dict()
+    for bound, count in data['buckets'].items():
+        yield f'{name}_bucket{_labels(**labels, le=bound)} {count}'
+    yield f'{name}_sum{_labels(**labels)} {data["sum"]}'
+    yield f'{name}_count{_labels(**labels)} {data["count"]}'
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    with metrics._lock:
+        requests = sorted(metrics.requests.items())
+        latency = sorted(metrics.latency.items())
+        query_counts = sorted(metrics.query_counts.items())
+        db_seconds = sorted(metrics.db_seconds.items())
+        n_plus_one = sorted(metrics.n_plus_one.items())
+
+    header('inventory_http_requests_total', 'counter', 'Requests served')
+    for (endpoint, method, status), count in requests:
+        lines.append(f'inventory_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    header('inventory_http_request_duration_seconds', 'histogram', 'Request latency')
+    for endpoint, histogram in latency:
+        lines.extend(_histogram_lines('inventory_http_request_duration_seconds', histogram, endpoint=endpoint))
+
+    header('inventory_db_queries_per_request', 'histogram', 'SQL statements per request')
+    for endpoint, histogram in query_counts:
+        lines.extend(_histogram_lines('inventory_db_queries_per_request', histogram, endpoint=endpoint))
+
+    header('inventory_db_seconds', 'histogram', 'Time spent in SQL statements per request')
+    for endpoint, histogram in db_seconds:
+        lines.extend(_histogram_lines('inventory_db_seconds', histogram, endpoint=endpoint))
+
+    header('inventory_n_plus_one_requests_total', 'counter',
+           f'Requests repeating one statement {N_PLUS_ONE_THRESHOLD}+ times')
+    for endpoint, count in n_plus_one:
+        lines.append(f'inventory_n_plus_one_requests_total{_labels(endpoint=endpoint)} {count}')
+
+    pool = db.engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        header('inventory_db_pool_checked_out', 'gauge', 'Connections in use')
+        lines.append(f'inventory_db_pool_checked_out {pool.checkedout()}')
+        header('inventory_db_pool_overflow', 'gauge', 'Connections open beyond the pool size')
+        lines.append(f'inventory_db_pool_overflow {max(pool.overflow(), 0)}')
+        header('inventory_db_pool_timeouts_total', 'counter', 'Checkouts that timed out')
+        lines.append(f'inventory_db_pool_timeouts_total {pool.timeouts}')
+        header('inventory_db_pool_wait_seconds', 'histogram', 'Connection checkout wait')
+        lines.extend(_histogram_lines('inventory_db_pool_wait_seconds', pool.wait_times))
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Install the request hooks and the /metrics and /api/profiling endpoints"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    profile_headers = app.config.get('PROFILE_HEADERS', False)
+
+    @app.before_request
+    def start_request():
+        _start_request()
+        g.profile_headers = profile_headers
+
+    app.after_request(_finish_request)
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/api/profiling')
+    def api_profiling():
+        return jsonify(metrics.summary())
@@ -1,6 +1,8 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import JSON
+from sqlalchemy import JSON, String, case, cast, event, select, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, object_session, attributes
 
 db = SQLAlchemy()
 
@@ -13,6 +15,11 @@ class Module(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
     location_description = db.Column(db.String(200))  # Physical location in lab/shop
+    
+    # Denormalized counters, maintained by the events at the end of this module
+    level_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    location_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -28,7 +35,8 @@ class Module(db.Model):
             'name': self.name,
             'description': self.description,
             'location_description': self.location_description,
-            'level_count': len(self.levels),
+            'level_count': self.level_count,
+            'location_count': self.location_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -45,12 +53,18 @@ class Level(db.Model):
     rows = db.Column(db.Integer, default=1)  # Number of rows in grid
     columns = db.Column(db.Integer, default=1)  # Number of columns in grid
     description = db.Column(db.Text)
+    
+    # Denormalized counters
+    location_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    occupied_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Locations holding items
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     module = db.relationship('Module', back_populates='levels')
-    locations = db.relationship('Location', back_populates='level', cascade='all, delete-orphan')
+    # Deleted in bulk with the level (see _level_deleting) instead of row by row
+    locations = db.relationship('Location', back_populates='level', cascade='all, delete-orphan', passive_deletes=True)
     
     # Unique constraint: one level number per module
     __table_args__ = (
@@ -70,7 +84,8 @@ class Level(db.Model):
             'rows': self.rows,
             'columns': self.columns,
             'description': self.description,
-            'location_count': len(self.locations),
+            'location_count': self.location_count,
+            'occupied_count': self.occupied_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -85,6 +100,11 @@ class Location(db.Model):
     row = db.Column(db.String(10), nullable=False)  # A, B, C or 1, 2, 3
     column = db.Column(db.String(10), nullable=False)  # 1, 2, 3 or A, B, C
     
+    # Canonical 'Module:Level:RowCol' address (see cell_label), kept current
+    # by the events at the end of this module so locations can be looked up
+    # and prefix-filtered
+    address = db.Column(db.String(150), nullable=False)
+    
     # Location characteristics
     location_type = db.Column(db.String(50), default='general')  # small_box, medium_bin, large_bin, liquid_container, etc.
     width_mm = db.Column(db.Float)
@@ -92,6 +112,9 @@ class Location(db.Model):
     depth_mm = db.Column(db.Float)
     notes = db.Column(db.Text)
     
+    # Denormalized counter
+    item_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -102,6 +125,9 @@ class Location(db.Model):
     # Unique constraint: one location per row/col in a level
     __table_args__ = (
         db.UniqueConstraint('level_id', 'row', 'column', name='unique_level_position'),
+        # varchar_pattern_ops also serves LIKE 'Zeus:3:%' prefix scans on Postgres
+        db.Index('ix_locations_address', 'address', unique=True,
+                 postgresql_ops={'address': 'varchar_pattern_ops'}),
     )
     
     def __repr__(self):
@@ -109,9 +135,11 @@ class Location(db.Model):
     
     def full_address(self):
         """Returns full address like 'Zeus:3:B4'"""
+        if self.address:
+            return self.address
         if self.level and self.level.module:
-            return f"{self.level.module.name}:{self.level.level_number}:{self.row}{self.column}"
-        return f"{self.row}{self.column}"
+            return address_prefix(self.level.module.name, self.level.level_number) + cell_label(self.row, self.column)
+        return cell_label(self.row, self.column)
     
     def to_dict(self):
         return {
@@ -129,7 +157,7 @@ class Location(db.Model):
                 'depth_mm': self.depth_mm,
             } if self.width_mm or self.height_mm or self.depth_mm else None,
             'notes': self.notes,
-            'item_count': len(self.item_locations),
+            'item_count': self.item_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -145,12 +173,12 @@ class Item(db.Model):
     category = db.Column(db.String(100))  # electronics, fasteners, tools, paints, etc.
     
     # Structured metadata (parsed from description or manually entered)
-    item_metadata = db.Column(JSON)  # Flexible storage for specs, dimensions, etc.
+    item_metadata = db.Column(JSON().with_variant(JSONB, 'postgresql'))  # Flexible storage for specs, dimensions, etc.
 
     # Item characteristics
     item_type = db.Column(db.String(50))  # solid, liquid, smd_component, bulk, etc.
     notes = db.Column(db.Text)
-    tags = db.Column(db.String(500))  # Comma-separated tags
+    tags = db.Column(db.String(500))  # Comma-separated tags, as entered; ItemTag holds them normalized
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -210,3 +238,442 @@ class ItemLocation(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+
+
+class ItemTag(db.Model):
+    """One normalized tag of an item, kept in sync with Item.tags"""
+    __tablename__ = 'item_tags'
+    
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    
+    __table_args__ = (
+        # Exact and prefix (LIKE 'm3%') tag lookups
+        db.Index('ix_item_tags_tag', 'tag', 'item_id', postgresql_ops={'tag': 'varchar_pattern_ops'}),
+    )
+    
+    def __repr__(self):
+        return f'<ItemTag Item:{self.item_id} {self.tag}>'
+
+
+def normalize_tags(tags):
+    """Distinct lowercase tags of a comma-separated string (or list), in order"""
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    normalized = (' '.join(str(tag).lower().split())[:100] for tag in tags or ())
+    return list(dict.fromkeys(tag for tag in normalized if tag))
+
+
+class ItemNeighbor(db.Model):
+    """Precomputed similar items, maintained by app.services.similar_items"""
+    __tablename__ = 'item_neighbors'
+    
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True)  # 1 = most similar
+    neighbor_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity, 0-1
+    
+    def __repr__(self):
+        return f'<ItemNeighbor Item:{self.item_id} #{self.rank} Item:{self.neighbor_id}>'
+
+
+class Revision(db.Model):
+    """A change counter, bumped in the transaction of every write it covers"""
+    __tablename__ = 'revisions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<Revision {self.name}={self.value}>'
+
+
+# Counter maintenance
+#
+# The counters above are adjusted with relative UPDATEs on the flushing
+# connection, so they commit or roll back together with the rows that
+# changed them. The UPDATEs keep updated_at as is: a counter changing is
+# not an edit of the row. Bulk statements that bypass the ORM must adjust
+# them themselves or call recount_levels().
+
+modules_t = Module.__table__
+levels_t = Level.__table__
+locations_t = Location.__table__
+item_locations_t = ItemLocation.__table__
+
+
+def _level_of(location_id):
+    return select(locations_t.c.level_id).where(locations_t.c.id == location_id).scalar_subquery()
+
+
+def _module_of(level_id):
+    return select(levels_t.c.module_id).where(levels_t.c.id == level_id).scalar_subquery()
+
+
+def _mark_stale(target, model, pk):
+    """Expire the counters of model row pk on loaded objects once the flush is done"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('stale_counters', set()).add((model, pk))
+
+
+def _loaded(target, model, pk):
+    session = object_session(target)
+    return session.identity_map.get(session.identity_key(model, pk)) if session is not None else None
+
+
+def _deleted_with(target, model, pk):
+    """Whether the flush deleting target also deletes model row pk, whose counters then do not matter"""
+    parent = _loaded(target, model, pk)
+    return parent is not None and parent in object_session(target).deleted
+
+
+@event.listens_for(Level, 'after_insert')
+def _level_inserted(mapper, connection, level):
+    connection.execute(
+        modules_t.update().where(modules_t.c.id == level.module_id)
+        .values(level_count=modules_t.c.level_count + 1, updated_at=modules_t.c.updated_at)
+    )
+    _mark_stale(level, Module, level.module_id)
+
+
+@event.listens_for(Level, 'before_delete')
+def _level_deleting(mapper, connection, level):
+    """Delete the level's locations and their placements with one statement each"""
+    location_ids = connection.execute(select(locations_t.c.id).where(locations_t.c.level_id == level.id)).scalars().all()
+    if location_ids:
+        connection.execute(item_locations_t.delete().where(item_locations_t.c.location_id.in_(location_ids)))
+        connection.execute(locations_t.delete().where(locations_t.c.id.in_(location_ids)))
+        object_session(level).info.setdefault('deleted_locations', set()).update(location_ids)
+
+    if _deleted_with(level, Module, level.module_id):
+        return
+    # Locations of a deleted level leave its counters alone (see _location_deleted),
+    # so the level row still holds the module's share
+    level_locations = select(levels_t.c.location_count).where(levels_t.c.id == level.id).scalar_subquery()
+    connection.execute(
+        modules_t.update().where(modules_t.c.id == level.module_id)
+        .values(
+            level_count=modules_t.c.level_count - 1,
+            location_count=modules_t.c.location_count - level_locations,
+            updated_at=modules_t.c.updated_at,
+        )
+    )
+    _mark_stale(level, Module, level.module_id)
+
+
+def adjust_location_counts(connection, level_id, delta, occupied=0):
+    """Add delta to the location counters of a level and its module (no expiry)"""
+    connection.execute(
+        levels_t.update().where(levels_t.c.id == level_id)
+        .values(
+            location_count=levels_t.c.location_count + delta,
+            occupied_count=levels_t.c.occupied_count + occupied,
+            updated_at=levels_t.c.updated_at,
+        )
+    )
+    connection.execute(
+        modules_t.update().where(modules_t.c.id == _module_of(level_id))
+        .values(location_count=modules_t.c.location_count + delta, updated_at=modules_t.c.updated_at)
+    )
+
+
+@event.listens_for(Location, 'after_insert')
+def _location_inserted(mapper, connection, location):
+    adjust_location_counts(connection, location.level_id, 1)
+    _mark_stale(location, Level, location.level_id)
+
+
+@event.listens_for(Location, 'after_delete')
+def _location_deleted(mapper, connection, location):
+    if _deleted_with(location, Level, location.level_id):
+        return
+    adjust_location_counts(connection, location.level_id, -1)
+    _mark_stale(location, Level, location.level_id)
+
+
+@event.listens_for(ItemLocation, 'after_insert')
+def _item_location_inserted(mapper, connection, item_location):
+    location_id = item_location.location_id
+    connection.execute(
+        locations_t.update().where(locations_t.c.id == location_id)
+        .values(item_count=locations_t.c.item_count + 1, updated_at=locations_t.c.updated_at)
+    )
+    # The location just became occupied
+    connection.execute(
+        levels_t.update()
+        .where(levels_t.c.id == _level_of(location_id))
+        .where(select(locations_t.c.item_count).where(locations_t.c.id == location_id).scalar_subquery() == 1)
+        .values(occupied_count=levels_t.c.occupied_count + 1, updated_at=levels_t.c.updated_at)
+    )
+    _mark_stale(item_location, Location, location_id)
+
+
+@event.listens_for(ItemLocation, 'after_delete')
+def _item_location_deleted(mapper, connection, item_location):
+    location_id = item_location.location_id
+    location = _loaded(item_location, Location, location_id)
+    if location is not None and _deleted_with(item_location, Level, location.__dict__.get('level_id')):
+        return
+    connection.execute(
+        locations_t.update().where(locations_t.c.id == location_id)
+        .values(item_count=locations_t.c.item_count - 1, updated_at=locations_t.c.updated_at)
+    )
+    # The location just became empty
+    connection.execute(
+        levels_t.update()
+        .where(levels_t.c.id == _level_of(location_id))
+        .where(select(locations_t.c.item_count).where(locations_t.c.id == location_id).scalar_subquery() == 0)
+        .values(occupied_count=levels_t.c.occupied_count - 1, updated_at=levels_t.c.updated_at)
+    )
+    _mark_stale(item_location, Location, location_id)
+
+
+_COUNTER_ATTRS = {
+    Module: ['level_count', 'location_count'],
+    Level: ['location_count', 'occupied_count'],
+    Location: ['item_count'],
+}
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_stale_counters(session, flush_context):
+    """Make loaded objects re-read counters changed behind the ORM's back"""
+    pending = list(session.info.pop('stale_counters', ()))
+    while pending:
+        model, pk = pending.pop()
+        obj = session.identity_map.get(session.identity_key(model, pk))
+        if obj is None:
+            continue
+        session.expire(obj, _COUNTER_ATTRS[model])
+        # Location totals roll up to the level and the module
+        if model is Location:
+            pending.append((Level, obj.__dict__.get('level_id')))
+        elif model is Level:
+            pending.append((Module, obj.__dict__.get('module_id')))
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _forget_deleted_locations(session, flush_context):
+    """Drop loaded locations and placements that went with a deleted level"""
+    location_ids = session.info.pop('deleted_locations', None)
+    if not location_ids:
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Location) and obj.__dict__.get('id') in location_ids:
+            session.expunge(obj)
+        elif isinstance(obj, ItemLocation) and obj.__dict__.get('location_id') in location_ids:
+            item = _loaded(obj, Item, obj.__dict__.get('item_id'))
+            if item is not None:
+                session.expire(item, ['item_locations'])
+            session.expunge(obj)
+
+
+# Tag maintenance: item_tags follows Item.tags on every ORM write. Bulk
+# inserts that bypass the ORM write item_tags themselves (see the importer).
+
+item_tags_t = ItemTag.__table__
+
+
+def _write_tags(connection, item_id, tags):
+    rows = [{'item_id': item_id, 'tag': tag} for tag in normalize_tags(tags)]
+    if rows:
+        connection.execute(item_tags_t.insert(), rows)
+
+
+@event.listens_for(Item, 'after_insert')
+def _item_inserted(mapper, connection, item):
+    _write_tags(connection, item.id, item.tags)
+
+
+@event.listens_for(Item, 'after_update')
+def _item_updated(mapper, connection, item):
+    if attributes.get_history(item, 'tags').has_changes():
+        connection.execute(item_tags_t.delete().where(item_tags_t.c.item_id == item.id))
+        _write_tags(connection, item.id, item.tags)
+
+
+@event.listens_for(Item, 'after_delete')
+def _item_deleted(mapper, connection, item):
+    # PostgreSQL cascades; SQLite does not enforce the foreign key
+    connection.execute(item_tags_t.delete().where(item_tags_t.c.item_id == item.id))
+
+
+def address_prefix(module_name, level_number):
+    """Address prefix shared by every location of a level, e.g. 'Zeus:3:'"""
+    return f'{module_name}:{level_number}:'
+
+
+def cell_label(row, column):
+    """
+    A cell's label within its level: 'B4' for lettered rows, '11-1' for
+    numbered ones (levels over 26 rows), so that row 1 / column 11 and
+    row 11 / column 1 do not both become '111'.
+    """
+    return f'{row}-{column}' if row[:1].isdigit() else row + column
+
+
+def _cell_label_sql(row, column):
+    """SQL version of cell_label() over row and column expressions"""
+    return case((func.substr(row, 1, 1).between('0', '9'), row + '-' + column), else_=row + column)
+
+
+def _level_prefix_sql():
+    """SQL for the address prefix of the level owning locations_t's row"""
+    return (
+        select(modules_t.c.name + ':' + cast(levels_t.c.level_number, String) + ':')
+        .select_from(levels_t.join(modules_t, modules_t.c.id == levels_t.c.module_id))
+        .where(levels_t.c.id == locations_t.c.level_id)
+        .scalar_subquery()
+    )
+
+
+@event.listens_for(Location, 'before_insert')
+def _location_address(mapper, connection, location):
+    if location.address:
+        return
+    prefix = connection.execute(
+        select(modules_t.c.name, levels_t.c.level_number)
+        .select_from(levels_t.join(modules_t, modules_t.c.id == levels_t.c.module_id))
+        .where(levels_t.c.id == location.level_id)
+    ).first()
+    location.address = address_prefix(*prefix) + cell_label(location.row, location.column)
+
+
+def _rename_addresses(connection, where, old_prefix, new_prefix):
+    """Swap the address prefix of the locations matched by where"""
+    connection.execute(
+        locations_t.update().where(where).values(
+            address=new_prefix + func.substr(locations_t.c.address, len(old_prefix) + 1)
+        )
+    )
+
+
+@event.listens_for(Module, 'after_update')
+def _module_renamed(mapper, connection, module):
+    history = attributes.get_history(module, 'name')
+    if not history.deleted or history.deleted[0] == module.name:
+        return
+    _rename_addresses(
+        connection,
+        locations_t.c.level_id.in_(select(levels_t.c.id).where(levels_t.c.module_id == module.id)),
+        f'{history.deleted[0]}:', f'{module.name}:',
+    )
+    _expire_addresses(module)
+
+
+@event.listens_for(Level, 'after_update')
+def _level_renumbered(mapper, connection, level):
+    history = attributes.get_history(level, 'level_number')
+    if not history.deleted or history.deleted[0] == level.level_number:
+        return
+    module_name = connection.execute(
+        select(modules_t.c.name).where(modules_t.c.id == level.module_id)
+    ).scalar()
+    _rename_addresses(
+        connection, locations_t.c.level_id == level.id,
+        address_prefix(module_name, history.deleted[0]), address_prefix(module_name, level.level_number),
+    )
+    _expire_addresses(level)
+
+
+def _expire_addresses(target):
+    """Have loaded locations re-read their address once the flush is done"""
+    session = object_session(target)
+    if session is not None:
+        session.info['stale_addresses'] = True
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_stale_addresses(session, flush_context):
+    if session.info.pop('stale_addresses', False):
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Location):
+                session.expire(obj, ['address'])
+
+
+def refresh_addresses(level_ids=None):
+    """Recompute stored location addresses, e.g. to backfill a database"""
+    update = locations_t.update().values(
+        address=_level_prefix_sql() + _cell_label_sql(locations_t.c.row, locations_t.c.column)
+    )
+    if level_ids is not None:
+        update = update.where(locations_t.c.level_id.in_(list(level_ids)))
+    db.session.execute(update)
+    db.session.expire_all()
+
+
+def recount_levels(level_ids=None):
+    """
+    Recompute counters from the underlying rows.
+
+    Used after bulk statements that bypass the ORM and to backfill existing
+    databases. Limits the work to the given levels (and their modules) if
+    level_ids is given.
+    """
+    occupied = (
+        select(func.count(func.distinct(ItemLocation.location_id)))
+        .join(Location, Location.id == ItemLocation.location_id)
+        .where(Location.level_id == levels_t.c.id)
+        .scalar_subquery()
+    )
+    location_count = select(func.count(locations_t.c.id)).where(locations_t.c.level_id == levels_t.c.id).scalar_subquery()
+    item_count = select(func.count(ItemLocation.id)).where(ItemLocation.location_id == locations_t.c.id).scalar_subquery()
+
+    update_locations = locations_t.update().values(item_count=item_count, updated_at=locations_t.c.updated_at)
+    update_levels = levels_t.update().values(
+        location_count=location_count, occupied_count=occupied, updated_at=levels_t.c.updated_at,
+    )
+    update_modules = modules_t.update().values(
+        updated_at=modules_t.c.updated_at,
+        level_count=select(func.count(levels_t.c.id)).where(levels_t.c.module_id == modules_t.c.id).scalar_subquery(),
+        location_count=select(func.coalesce(func.sum(levels_t.c.location_count), 0))
+        .where(levels_t.c.module_id == modules_t.c.id).scalar_subquery(),
+    )
+    if level_ids is not None:
+        level_ids = list(level_ids)
+        update_locations = update_locations.where(locations_t.c.level_id.in_(level_ids))
+        update_levels = update_levels.where(levels_t.c.id.in_(level_ids))
+        update_modules = update_modules.where(modules_t.c.id.in_(
+            select(levels_t.c.module_id).where(levels_t.c.id.in_(level_ids))
+        ))
+
+    db.session.execute(update_locations)
+    db.session.execute(update_levels)
+    db.session.execute(update_modules)
+    bump_revision(db.session.connection())
+    db.session.expire_all()
+
+
+# Hierarchy revision: bumped with any module, level, location or placement
+# write, so clients holding the location tree can tell whether it changed.
+# The UPDATE holds the row lock until commit, which serializes those writes.
+# Bulk statements that bypass the ORM call bump_revision() themselves.
+
+HIERARCHY = 'hierarchy'
+revisions_t = Revision.__table__
+
+
+def bump_revision(connection, name=HIERARCHY):
+    """Increment a revision on connection, creating it on first use"""
+    updated = connection.execute(
+        revisions_t.update().where(revisions_t.c.name == name).values(value=revisions_t.c.value + 1)
+    )
+    if not updated.rowcount:
+        connection.execute(revisions_t.insert().values(name=name, value=1))
+
+
+def current_revision(connection, name=HIERARCHY):
+    value = connection.execute(select(revisions_t.c.value).where(revisions_t.c.name == name)).scalar()
+    return value or 0
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_hierarchy_revision(session, flush_context):
+    hierarchy_types = (Module, Level, Location, ItemLocation)
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        if isinstance(obj, hierarchy_types) and (
+            obj not in session.dirty or session.is_modified(obj, include_collections=False)
+        ):
+            bump_revision(session.connection())
+            return
@@ -1,38 +1,67 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+import io
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+from sqlalchemy import select
 from app.models import db, Item, ItemLocation, Location, Level, Module
+from app.services.loading import profile
+from app.services.search import apply_search, rank_expression
+from app.services.pagination import paginate, link_header
+from app.services.importer import import_stream, DEFAULT_BATCH_SIZE
+from app.services import duplicate_detection, exporter, location_suggestion, similar_items, specs, tags
+from app.services.response_cache import cached_json
+from app.cli import format_from_filename
 
 bp = Blueprint('items', __name__)
 
 
+def _apply_filters(query, spec=True):
+    """Apply the category, tag and (unless spec=False) spec filters of the request"""
+    category = request.args.get('category')
+    if category:
+        query = query.filter(Item.category == category)
+    query = tags.apply(query, tags.parse_args(request.args))
+    return specs.apply(query, specs.parse_args(request.args)) if spec else query
+
+
+def _result_ids():
+    """select() of the ids matching the request's filters and search, or None without any"""
+    search = request.args.get('search')
+    if not (search or any(request.args.get(f) for f in ('category', 'spec', 'tag'))):
+        return None
+    query = _apply_filters(select(Item.id))
+    return apply_search(query, search).order_by(None) if search else query
+
+
+def _sort_keys(search=None):
+    """Keyset sort order for item listings: relevance first when searching"""
+    rank = rank_expression(search) if search else None
+    keys = [Item.name, Item.id]
+    return [rank.desc()] + keys if rank is not None else keys
+
+
 @bp.route('/')
 def list_items():
     """List all items"""
     # Get filter parameters
-    category = request.args.get('category')
     search = request.args.get('search')
     
-    query = Item.query
+    query = Item.query.options(*profile('item_row'))
     
-    if category:
-        query = query.filter(Item.category == category)
+    try:
+        query = _apply_filters(query)
+    except specs.InvalidSpec as e:
+        flash(e.description, 'error')
+        query = _apply_filters(query, spec=False)
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            db.or_(
-                Item.name.ilike(search_term),
-                Item.description.ilike(search_term),
-                Item.tags.ilike(search_term)
-            )
-        )
+        query = apply_search(query, search)
     
-    items = query.order_by(Item.name).all()
+    page = paginate(query, _sort_keys(search), cursor=request.args.get('cursor'))
     
     # Get unique categories for filter dropdown
     categories = db.session.query(Item.category).distinct().all()
     categories = [c[0] for c in categories if c[0]]
     
-    return render_template('items/list.html', items=items, categories=categories)
+    return render_template('items/list.html', items=page.items, page=page, categories=categories)
 
 
 @bp.route('/new', methods=['GET', 'POST'])
@@ -51,7 +80,14 @@ def new_item():
 
         if not name or not description:
             flash('Name and description are required', 'error')
-            return render_template('items/form.html', modules=Module.query.all())
+            return render_template('items/form.html')
+
+        # Warn about near-duplicates once; the resubmitted form carries confirm_duplicate
+        if not request.form.get('confirm_duplicate'):
+            duplicates = duplicate_detection.find_duplicates(name, description)
+            if duplicates:
+                flash('Similar items already exist. Create this one anyway?', 'warning')
+                return render_template('items/form.html', draft=request.form, duplicates=duplicates)
 
         item = Item(
             name=name,
@@ -74,21 +110,25 @@ def new_item():
             db.session.add(item_location)
         
         db.session.commit()
+        similar_items.refresh_pending()
         
         flash(f'Item "{name}" created successfully', 'success')
         return redirect(url_for('items.view_item', item_id=item.id))
     
-    # For GET request, load modules for location selection
-    modules = Module.query.order_by(Module.name).all()
-    return render_template('items/form.html', modules=modules)
+    # Prefilled type or category (e.g. "add another like this") gets suggestions right away
+    suggestions = None
+    if request.args.get('category') or request.args.get('item_type'):
+        suggestions, _ = location_suggestion.suggest(request.args.get('item_type'), request.args.get('category'))
+    
+    return render_template('items/form.html', suggestions=suggestions)
 
 
 @bp.route('/<int:item_id>')
 def view_item(item_id):
     """View item details"""
-    item = Item.query.get_or_404(item_id)
-    modules = Module.query.order_by(Module.name).all()
-    return render_template('items/view.html', item=item, modules=modules)
+    item = Item.query.options(*profile('item')).get_or_404(item_id)
+    related = similar_items.related(item.id)
+    return render_template('items/view.html', item=item, related=related)
 
 
 @bp.route('/<int:item_id>/edit', methods=['GET', 'POST'])
@@ -106,15 +146,15 @@ def edit_item(item_id):
         
         if not item.name or not item.description:
             flash('Name and description are required', 'error')
-            return render_template('items/form.html', item=item, modules=Module.query.all())
+            return render_template('items/form.html', item=item)
         
         db.session.commit()
+        similar_items.refresh_pending()
         
         flash(f'Item "{item.name}" updated successfully', 'success')
         return redirect(url_for('items.view_item', item_id=item.id))
     
-    modules = Module.query.order_by(Module.name).all()
-    return render_template('items/form.html', item=item, modules=modules)
+    return render_template('items/form.html', item=item)
 
 
 @bp.route('/<int:item_id>/delete', methods=['POST'])
@@ -125,6 +165,7 @@ def delete_item(item_id):
     
     db.session.delete(item)
     db.session.commit()
+    similar_items.refresh_pending()
     
     flash(f'Item "{name}" deleted successfully', 'success')
     return redirect(url_for('items.list_items'))
@@ -157,7 +198,7 @@ def add_location(item_id):
     db.session.add(item_location)
     db.session.commit()
     
-    location = Location.query.get(location_id)
+    location = Location.query.options(*profile('location')).get(location_id)
     flash(f'Location {location.full_address()} added successfully', 'success')
     return redirect(url_for('items.view_item', item_id=item_id))
 
@@ -186,28 +227,137 @@ def remove_location(item_id, item_location_id):
 def api_list_items():
     """API endpoint to list items"""
     search = request.args.get('search')
-    category = request.args.get('category')
     
-    query = Item.query
+    query = Item.query.options(*profile('item'))
     
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            db.or_(
-                Item.name.ilike(search_term),
-                Item.description.ilike(search_term)
-            )
-        )
+        query = apply_search(query, search)
     
-    if category:
-        query = query.filter(Item.category == category)
+    query = _apply_filters(query)
+    
+    page = paginate(
+        query, _sort_keys(search),
+        cursor=request.args.get('cursor'),
+        per_page=request.args.get('limit', type=int)
+    )
+    response = jsonify([i.to_dict() for i in page.items])
+    if page.has_next or page.has_prev:
+        response.headers['Link'] = link_header(page)
+    return response
+
+
+@bp.route('/api/metadata/facets', methods=['GET'])
+@cached_json(lambda: ['items'])
+def api_metadata_facets():
+    """
+    API endpoint listing the item_metadata keys in use, with item counts
+    and the most common values of each.
+
+    Takes the same search, category, spec and tag filters as the item list.
+    """
+    values = min(request.args.get('values', specs.FACET_VALUES, type=int), 100)
+    return jsonify(specs.facets(_result_ids(), values=values))
+
+
+@bp.route('/api/facets', methods=['GET'])
+@cached_json(lambda: ['items'])
+def api_facets():
+    """
+    API endpoint for tag, category and item type counts of the items
+    matching the same search, category, spec and tag filters as the item list.
+    """
+    limit = min(request.args.get('tags', tags.FACET_TAGS, type=int), 500)
+    return jsonify(tags.facets(_result_ids(), tags=limit))
+
+
+@bp.route('/api/duplicates', methods=['GET'])
+def api_duplicates():
+    """
+    API endpoint to check an item's name and description for near-duplicates.
+
+    item_id leaves that item itself out, for checking an edit.
+    """
+    name = request.args.get('name', '')
+    description = request.args.get('description', '')
+    if not name.strip() and not description.strip():
+        return jsonify({'error': 'Expected a name or description'}), 400
+    
+    limit = max(1, min(request.args.get('limit', type=int, default=duplicate_detection.DEFAULT_LIMIT), 50))
+    matches = duplicate_detection.find_duplicates(name, description, limit, exclude_id=request.args.get('item_id', type=int))
+    return jsonify({
+        'duplicates': [dict(item.to_dict(), similarity=similarity) for item, similarity in matches],
+    })
+
+
+@bp.route('/api/duplicates/clusters', methods=['GET'])
+def api_duplicate_clusters():
+    """API endpoint listing groups of near-duplicate items, largest first"""
+    limit = request.args.get('limit', type=int, default=100)
+    clusters = duplicate_detection.index.clusters(min_size=request.args.get('min_size', type=int, default=2))
+    shown = clusters[:limit]
+    names = dict(
+        db.session.query(Item.id, Item.name).filter(Item.id.in_([i for c in shown for i in c]))
+    ) if shown else {}
     
-    items = query.order_by(Item.name).limit(50).all()
-    return jsonify([i.to_dict() for i in items])
+    return jsonify({
+        'total_clusters': len(clusters),
+        'items_in_clusters': sum(len(c) for c in clusters),
+        'clusters': [
+            [{'id': item_id, 'name': names.get(item_id)} for item_id in cluster]
+            for cluster in shown
+        ],
+    })
 
 
 @bp.route('/api/items/<int:item_id>', methods=['GET'])
 def api_get_item(item_id):
     """API endpoint to get a single item"""
-    item = Item.query.get_or_404(item_id)
+    item = Item.query.options(*profile('item')).get_or_404(item_id)
     return jsonify(item.to_dict())
+
+
+@bp.route('/api/items/<int:item_id>/similar', methods=['GET'])
+def api_similar_items(item_id):
+    """API endpoint for an item's precomputed similar items"""
+    Item.query.get_or_404(item_id)
+    limit = min(request.args.get('limit', similar_items.NEIGHBORS, type=int), similar_items.NEIGHBORS)
+    return jsonify([
+        {'id': other.id, 'name': other.name, 'category': other.category, 'score': round(score, 3)}
+        for other, score in similar_items.related(item_id, limit)
+    ])
+
+
+@bp.route('/import', methods=['POST'])
+def import_items():
+    """
+    Bulk import items, placements and hierarchy from CSV or JSONL.
+
+    Accepts a multipart upload in the "file" field or the raw request body.
+    The format comes from ?format=, else from the uploaded file name.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format') or format_from_filename(upload.filename if upload else None)
+    if fmt not in ('csv', 'jsonl', 'ndjson'):
+        return jsonify({'error': 'Specify format=csv or format=jsonl'}), 400
+    
+    raw = upload.stream if upload else request.stream
+    stream = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+    batch_size = request.args.get('batch_size', type=int, default=DEFAULT_BATCH_SIZE)
+    
+    report = import_stream(stream, fmt, batch_size)
+    return jsonify(report.to_dict())
+
+
+@bp.route('/export', methods=['GET'])
+def export_items():
+    """Stream every item with its location addresses as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        return jsonify({'error': 'Specify format=csv or format=ndjson'}), 400
+    
+    body = exporter.encode(exporter.iter_item_rows(), exporter.ITEM_COLUMNS, fmt)
+    return Response(
+        stream_with_context(body),
+        mimetype=exporter.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=items.{fmt}'}
+    )
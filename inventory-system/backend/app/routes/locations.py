@@ -1,8 +1,56 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from app.models import db, Location, Level, Item, ItemLocation
+from app.services.loading import profile
+from app.services.pagination import paginate, link_header
+from app.services import exporter, location_suggestion
+from app.services.response_cache import cached_json
 
 bp = Blueprint('locations', __name__)
 
+# Keyset sort order shared by the location listings
+SORT_KEYS = (Level.module_id, Level.level_number, Location.row, Location.column, Location.id)
+
+# Default page size of the location API
+API_PER_PAGE = 500
+
+# Most addresses accepted by one resolve call
+MAX_RESOLVE = 1000
+
+
+def filter_address(query, pattern):
+    """Filter by exact address, or by prefix when pattern ends in '*' (e.g. 'Zeus:3:*')"""
+    if pattern.endswith('*'):
+        prefix = pattern[:-1].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return query.filter(Location.address.like(prefix + '%', escape='\\'))
+    return query.filter(Location.address == pattern)
+
+
+def filter_api_listing(query, args):
+    """Apply the filters of the location API (also served by app.async_api) from args"""
+    level_id = args.get('level_id', type=int)
+    location_type = args.get('location_type')
+    available = args.get('available', type=bool)
+    address = args.get('address')
+    
+    if address:
+        query = filter_address(query, address)
+    
+    if level_id:
+        query = query.filter(Location.level_id == level_id)
+    
+    if location_type:
+        query = query.filter(Location.location_type == location_type)
+    
+    if available:
+        query = query.filter(Location.item_count == 0)
+    return query
+
+
+def _location_tags():
+    """Cache tags of a location listing: one level's, or all of them"""
+    level_id = request.args.get('level_id', type=int)
+    return [f'locations:{level_id}' if level_id else 'locations']
+
 
 @bp.route('/')
 def list_locations():
@@ -12,8 +60,12 @@ def list_locations():
     level_id = request.args.get('level_id', type=int)
     location_type = request.args.get('location_type')
     occupied = request.args.get('occupied')  # 'yes', 'no', or None
+    address = request.args.get('address')
+    
+    query = Location.query.options(*profile('location')).join(Level)
     
-    query = Location.query.join(Level)
+    if address:
+        query = filter_address(query, address)
     
     if level_id:
         query = query.filter(Location.level_id == level_id)
@@ -24,26 +76,27 @@ def list_locations():
         query = query.filter(Location.location_type == location_type)
     
     if occupied == 'yes':
-        query = query.join(ItemLocation).distinct()
+        query = query.filter(Location.item_count > 0)
     elif occupied == 'no':
-        query = query.outerjoin(ItemLocation).filter(ItemLocation.id == None)
+        query = query.filter(Location.item_count == 0)
     
-    locations = query.order_by(Level.module_id, Level.level_number, Location.row, Location.column).all()
+    page = paginate(query, SORT_KEYS, cursor=request.args.get('cursor'), per_page=100)
     
     # Get unique location types for filter dropdown
     location_types = db.session.query(Location.location_type).distinct().all()
     location_types = [lt[0] for lt in location_types if lt[0]]
     
     return render_template('locations/list.html', 
-                         locations=locations, 
+                         locations=page.items, 
+                         page=page,
                          location_types=location_types)
 
 
 @bp.route('/<int:location_id>')
 def view_location(location_id):
     """View location details and items stored there"""
-    location = Location.query.get_or_404(location_id)
-    item_locations = ItemLocation.query.filter_by(location_id=location_id).all()
+    location = Location.query.options(*profile('location')).get_or_404(location_id)
+    item_locations = ItemLocation.query.options(*profile('location_items')).filter_by(location_id=location_id).all()
     
     return render_template('locations/view.html', 
                          location=location, 
@@ -70,32 +123,103 @@ def edit_location(location_id):
     return render_template('locations/form.html', location=location)
 
 
+@bp.route('/export', methods=['GET'])
+def export_locations():
+    """Stream every location with its address and occupancy as CSV or NDJSON"""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.FORMATS:
+        return jsonify({'error': 'Specify format=csv or format=ndjson'}), 400
+    
+    body = exporter.encode(exporter.iter_location_rows(), exporter.LOCATION_COLUMNS, fmt)
+    return Response(
+        stream_with_context(body),
+        mimetype=exporter.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=locations.{fmt}'}
+    )
+
+
 # API endpoints
 
 @bp.route('/api/locations', methods=['GET'])
+@cached_json(_location_tags)
 def api_list_locations():
     """API endpoint to list locations with filters"""
-    level_id = request.args.get('level_id', type=int)
-    location_type = request.args.get('location_type')
-    available = request.args.get('available', type=bool)
-    
-    query = Location.query
-    
-    if level_id:
-        query = query.filter(Location.level_id == level_id)
-    
-    if location_type:
-        query = query.filter(Location.location_type == location_type)
-    
-    if available:
-        query = query.outerjoin(ItemLocation).filter(ItemLocation.id == None)
-    
-    locations = query.all()
-    return jsonify([l.to_dict() for l in locations])
+    query = filter_api_listing(Location.query.options(*profile('location')).join(Level), request.args)
+    page = paginate(
+        query, SORT_KEYS,
+        cursor=request.args.get('cursor'),
+        per_page=request.args.get('limit', type=int, default=API_PER_PAGE)
+    )
+    response = jsonify([l.to_dict() for l in page.items])
+    if page.has_next or page.has_prev:
+        response.headers['Link'] = link_header(page)
+    return response
 
 
 @bp.route('/api/locations/<int:location_id>', methods=['GET'])
 def api_get_location(location_id):
     """API endpoint to get a single location"""
-    location = Location.query.get_or_404(location_id)
+    location = Location.query.options(*profile('location')).get_or_404(location_id)
     return jsonify(location.to_dict())
+
+
+@bp.route('/api/suggest', methods=['GET'])
+def api_suggest():
+    """
+    API endpoint to rank storage locations for an item.
+
+    Describe the item with item_type, category and width_mm/height_mm/depth_mm,
+    or pass item_id of an existing item. module_id, level_id and empty=1
+    narrow the candidates.
+    """
+    filters = {
+        'module_id': request.args.get('module_id', type=int),
+        'level_id': request.args.get('level_id', type=int),
+        'empty_only': request.args.get('empty') == '1',
+        'limit': request.args.get('limit', type=int, default=location_suggestion.DEFAULT_LIMIT),
+    }
+    item_id = request.args.get('item_id', type=int)
+    if item_id:
+        item = Item.query.options(*profile('item')).get_or_404(item_id)
+        suggestions, candidates = location_suggestion.suggest_for_item(item, **filters)
+    else:
+        dimensions = [
+            size for size in (request.args.get(key, type=float) for key in ('width_mm', 'height_mm', 'depth_mm'))
+            if size and size > 0
+        ]
+        suggestions, candidates = location_suggestion.suggest(
+            request.args.get('item_type'), request.args.get('category'), dimensions, **filters
+        )
+    
+    return jsonify({
+        'suggestions': suggestions,
+        'candidates': candidates,
+    })
+
+
+@bp.route('/api/resolve', methods=['GET', 'POST'])
+def api_resolve():
+    """
+    API endpoint to resolve many addresses to location ids in one query.
+
+    Takes {"addresses": [...]} as JSON or repeated ?address= arguments.
+    """
+    if request.method == 'POST':
+        addresses = (request.get_json(silent=True) or {}).get('addresses')
+    else:
+        addresses = request.args.getlist('address')
+    
+    if not isinstance(addresses, list) or not all(isinstance(a, str) for a in addresses):
+        return jsonify({'error': 'Expected a list of address strings'}), 400
+    if len(addresses) > MAX_RESOLVE:
+        return jsonify({'error': f'At most {MAX_RESOLVE} addresses per request'}), 400
+    
+    wanted = {a.strip() for a in addresses if a.strip()}
+    resolved = dict(
+        db.session.query(Location.address, Location.id).filter(Location.address.in_(wanted))
+    ) if wanted else {}
+    
+    return jsonify({
+        'resolved': resolved,
+        'missing': sorted(wanted - resolved.keys()),
+    })
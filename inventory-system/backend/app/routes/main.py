@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template
-from app.models import Module, Level, Location, Item
+from flask import Blueprint, Response, render_template, request, jsonify
+from app.services import dashboard, hierarchy
+from app.services.pool import pool_stats
 
 bp = Blueprint('main', __name__)
 
@@ -7,20 +8,42 @@ bp = Blueprint('main', __name__)
 @bp.route('/')
 def index():
     """Main dashboard"""
-    stats = {
-        'modules': Module.query.count(),
-        'levels': Level.query.count(),
-        'locations': Location.query.count(),
-        'items': Item.query.count(),
-    }
+    stats = dashboard.get_stats()
+    recent_items = dashboard.recent_items()
     
-    recent_items = Item.query.order_by(Item.created_at.desc()).limit(10).all()
-    modules = Module.query.order_by(Module.name).all()
+    return render_template('index.html', stats=stats, recent_items=recent_items, modules=stats['module_summaries'])
+
+
+@bp.route('/api/stats')
+def api_stats():
+    """API endpoint for the dashboard statistics"""
+    return jsonify(dashboard.get_stats())
+
+
+@bp.route('/api/hierarchy')
+def api_hierarchy():
+    """The whole module/level/location tree for the location picker (see app.services.hierarchy)"""
+    revision = hierarchy.revision()
+    if request.args.get('since', type=int) == revision:
+        return jsonify({'revision': revision, 'changed': False})
     
-    return render_template('index.html', stats=stats, recent_items=recent_items, modules=modules)
+    etag = f'hierarchy-{revision}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)  # answered without building the tree
+    else:
+        response = Response(hierarchy.tree_json(revision), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # always revalidate
+    return response
 
 
 @bp.route('/about')
 def about():
     """About page"""
     return render_template('about.html')
+
+
+@bp.route('/api/pool')
+def api_pool():
+    """Connection pool state and checkout wait times for this worker process"""
+    return jsonify(pool_stats())
@@ -1,5 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-from app.models import db, Module, Level, Location
+from app.models import db, Module, Level
+from app.services.loading import profile
+from app.services.pagination import paginate
+from app.services.response_cache import cached_json
+from app.services.grid import create_locations_for_level, resize_level_grid, level_occupancy
 
 bp = Blueprint('modules', __name__)
 
@@ -7,8 +11,12 @@ bp = Blueprint('modules', __name__)
 @bp.route('/')
 def list_modules():
     """List all modules"""
-    modules = Module.query.order_by(Module.name).all()
-    return render_template('modules/list.html', modules=modules)
+    page = paginate(
+        Module.query.options(*profile('module')),
+        [Module.name, Module.id],
+        cursor=request.args.get('cursor')
+    )
+    return render_template('modules/list.html', modules=page.items, page=page)
 
 
 @bp.route('/new', methods=['GET', 'POST'])
@@ -48,7 +56,7 @@ def new_module():
 def view_module(module_id):
     """View module details and its levels"""
     module = Module.query.get_or_404(module_id)
-    levels = Level.query.filter_by(module_id=module_id).order_by(Level.level_number).all()
+    levels = Level.query.options(*profile('level')).filter_by(module_id=module_id).order_by(Level.level_number).all()
     return render_template('modules/view.html', module=module, levels=levels)
 
 
@@ -129,10 +137,11 @@ def new_level(module_id):
         )
         
         db.session.add(level)
-        db.session.commit()
+        db.session.flush()
         
         # Create locations for this level
         create_locations_for_level(level)
+        db.session.commit()
         
         flash(f'Level {level_number} created with {rows}x{columns} locations', 'success')
         return redirect(url_for('modules.view_module', module_id=module_id))
@@ -143,17 +152,8 @@ def new_level(module_id):
 @bp.route('/levels/<int:level_id>')
 def view_level(level_id):
     """View level details with its locations"""
-    level = Level.query.get_or_404(level_id)
-
-    # Organize locations by row and column
-    locations = Location.query.filter_by(level_id=level_id).all()
-    location_grid = {}
-    for loc in locations:
-        if loc.row not in location_grid:
-            location_grid[loc.row] = {}
-        location_grid[loc.row][loc.column] = loc
-
-    return render_template('levels/view.html', level=level, location_grid=location_grid, chr=chr)
+    level = Level.query.options(*profile('level')).get_or_404(level_id)
+    return render_template('levels/view.html', level=level, grid=level_occupancy(level))
 
 
 @bp.route('/levels/<int:level_id>/edit', methods=['GET', 'POST'])
@@ -193,18 +193,14 @@ def edit_level(level_id):
         level.columns = columns
         level.description = description
         
-        db.session.commit()
-        
-        # If grid size changed, recreate locations
+        # If grid size changed, add or remove only the cells on the changed edges
         if old_rows != rows or old_columns != columns:
-            # Delete old locations (cascade will handle item_locations)
-            Location.query.filter_by(level_id=level_id).delete()
+            db.session.flush()
+            added, removed = resize_level_grid(level)
             db.session.commit()
-            
-            # Create new locations
-            create_locations_for_level(level)
-            flash(f'Level updated and locations regenerated ({rows}x{columns})', 'success')
+            flash(f'Level resized to {rows}x{columns} ({added} locations added, {removed} removed)', 'success')
         else:
+            db.session.commit()
             flash(f'Level {level_number} updated successfully', 'success')
         
         return redirect(url_for('modules.view_level', level_id=level.id))
@@ -226,50 +222,34 @@ def delete_level(level_id):
     return redirect(url_for('modules.view_module', module_id=module_id))
 
 
-def create_locations_for_level(level):
-    """Helper function to create locations for a level based on its grid"""
-    rows = level.rows
-    columns = level.columns
-    
-    # Generate row labels (A, B, C... or 1, 2, 3...)
-    row_labels = [chr(65 + i) for i in range(rows)] if rows <= 26 else [str(i+1) for i in range(rows)]
-    
-    # Generate column labels (1, 2, 3...)
-    col_labels = [str(i+1) for i in range(columns)]
-    
-    locations = []
-    for row_label in row_labels:
-        for col_label in col_labels:
-            location = Location(
-                level_id=level.id,
-                row=row_label,
-                column=col_label,
-                location_type='general'
-            )
-            locations.append(location)
-    
-    db.session.add_all(locations)
-    db.session.commit()
-
-
 # API endpoints for AJAX requests
 
 @bp.route('/api/modules', methods=['GET'])
+@cached_json(lambda: ['modules'])
 def api_list_modules():
     """API endpoint to list all modules"""
-    modules = Module.query.order_by(Module.name).all()
+    modules = Module.query.options(*profile('module')).order_by(Module.name).all()
     return jsonify([m.to_dict() for m in modules])
 
 
 @bp.route('/api/modules/<int:module_id>', methods=['GET'])
 def api_get_module(module_id):
     """API endpoint to get a single module"""
-    module = Module.query.get_or_404(module_id)
+    module = Module.query.options(*profile('module')).get_or_404(module_id)
     return jsonify(module.to_dict())
 
 
 @bp.route('/api/modules/<int:module_id>/levels', methods=['GET'])
+@cached_json(lambda module_id: [f'levels:{module_id}'])
 def api_list_levels(module_id):
     """API endpoint to list levels for a module"""
-    levels = Level.query.filter_by(module_id=module_id).order_by(Level.level_number).all()
+    levels = Level.query.options(*profile('level')).filter_by(module_id=module_id).order_by(Level.level_number).all()
     return jsonify([l.to_dict() for l in levels])
+
+
+@bp.route('/api/levels/<int:level_id>/grid', methods=['GET'])
+@cached_json(lambda level_id: [f'locations:{level_id}'])
+def api_level_grid(level_id):
+    """API endpoint for a level's grid occupancy (see grid.level_occupancy)"""
+    level = Level.query.get_or_404(level_id)
+    return jsonify(level_occupancy(level))
@@ -1,5 +1,8 @@
 from flask import Blueprint, render_template, request, jsonify
-from app.models import db, Item
+from app.models import Item
+from app.services.loading import profile
+from app.services.search import search_items
+from app.services.autocomplete import suggest, DEFAULT_LIMIT
 
 bp = Blueprint('search', __name__)
 
@@ -11,15 +14,7 @@ def search():
     results = []
     
     if query:
-        search_term = f"%{query}%"
-        results = Item.query.filter(
-            db.or_(
-                Item.name.ilike(search_term),
-                Item.description.ilike(search_term),
-                Item.tags.ilike(search_term),
-                Item.notes.ilike(search_term)
-            )
-        ).order_by(Item.name).all()
+        results = search_items(query, Item.query.options(*profile('item_row')))
     
     return render_template('search/results.html', query=query, results=results)
 
@@ -32,17 +27,26 @@ def api_search():
     if not query:
         return jsonify({'results': []})
     
-    search_term = f"%{query}%"
-    items = Item.query.filter(
-        db.or_(
-            Item.name.ilike(search_term),
-            Item.description.ilike(search_term),
-            Item.tags.ilike(search_term)
-        )
-    ).order_by(Item.name).limit(20).all()
+    hits = search_items(query, Item.query.options(*profile('item')), limit=20)
     
     return jsonify({
         'query': query,
-        'count': len(items),
-        'results': [i.to_dict() for i in items]
+        'count': len(hits),
+        'results': [
+            dict(item.to_dict(), rank=rank, snippet=str(snippet) if snippet else None)
+            for item, rank, snippet in hits
+        ]
+    })
+
+
+@bp.route('/api/suggest', methods=['GET'])
+def api_suggest():
+    """API endpoint for search-as-you-type suggestions"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', type=int, default=DEFAULT_LIMIT)
+    
+    return jsonify({
+        'query': query,
+        'fields': ['id', 'name', 'address'],
+        'results': suggest(query, limit),
     })
@@ -0,0 +1,49 @@
+"""
+Database schema management.
+
+The schema is owned by the Flask-Migrate revisions in ``backend/migrations``;
+the app does not call ``create_all()`` when it starts. ``upgrade_database``
+brings a database to the latest revision and runs once per start, in the
+process that launches the server, before any worker is forked.
+
+Flask-Migrate (and Alembic behind it) is imported only when needed, so
+processes that skip the upgrade do not pay for it.
+"""
+
+import os
+from sqlalchemy import inspect
+from app.models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# Revisions matching databases created with create_all() before migrations
+BASELINE_REVISION = '0001'
+ADDRESSES_REVISION = '0002'
+
+
+def init_migrations(app):
+    """Register Flask-Migrate for the `flask db` commands"""
+    from flask_migrate import Migrate
+    if 'migrate' not in app.extensions:
+        Migrate(app, db, directory=MIGRATIONS_DIR)
+
+
+def _unversioned_revision(connection):
+    """Revision to stamp on a database that has tables but no alembic_version"""
+    inspector = inspect(connection)
+    if inspector.has_table('alembic_version') or not inspector.has_table('modules'):
+        return None
+    columns = {column['name'] for column in inspector.get_columns('locations')}
+    return ADDRESSES_REVISION if 'address' in columns else BASELINE_REVISION
+
+
+def upgrade_database(app):
+    """Apply pending migrations, adopting a database built by create_all()"""
+    from flask_migrate import stamp, upgrade
+    init_migrations(app)
+    with app.app_context():
+        with db.engine.connect() as connection:
+            revision = _unversioned_revision(connection)
+        if revision:
+            stamp(revision=revision)
+        upgrade()
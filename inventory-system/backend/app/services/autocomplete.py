@@ -0,0 +1,111 @@
+"""
+Search-as-you-type suggestions for item names.
+
+Suggestions are lightweight (id, name, address) tuples fetched in one query.
+On PostgreSQL names are matched by prefix or by trigram word similarity
+(``pg_trgm``), so small typos in part numbers still find the item. Results
+are memoized per normalized prefix in an in-process LRU that is cleared
+whenever an item or its placement is committed.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import case, func, literal
+from app.models import db, Module, Level, Location, Item, ItemLocation
+from app.services import write_tracking
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+
+
+class PrefixCache:
+    """Thread-safe LRU of normalized prefix -> suggestions with a TTL"""
+
+    def __init__(self, maxsize=2048, ttl=60):
+        self.maxsize = maxsize
+        # Other worker processes have their own cache and never see our
+        # invalidations, so entries also expire after ttl seconds.
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+cache = PrefixCache()
+
+
+def normalize(text):
+    """Normalize a typed prefix for matching and cache keys"""
+    return ' '.join(text.lower().split())
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def suggest(text, limit=DEFAULT_LIMIT):
+    """Return up to limit (id, name, address) tuples for a typed prefix"""
+    prefix = normalize(text)
+    if not prefix:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    key = (prefix, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    starts_with = Item.name.ilike(f'{_escape_like(prefix)}%', escape='\\')
+    query = (
+        db.session.query(Item.id, Item.name, func.min(Location.address))
+        .outerjoin(ItemLocation, ItemLocation.item_id == Item.id)
+        .outerjoin(Location, Location.id == ItemLocation.location_id)
+        .group_by(Item.id, Item.name)
+    )
+
+    if db.engine.dialect.name == 'postgresql':
+        # '<%' is pg_trgm's word-similarity operator and can use the
+        # trigram index on items.name.
+        query = query.filter(
+            db.or_(starts_with, literal(prefix).op('<%')(Item.name))
+        ).order_by(
+            case((starts_with, 0), else_=1),
+            func.word_similarity(prefix, Item.name).desc(),
+            Item.name,
+        )
+    else:
+        contains = Item.name.ilike(f'%{_escape_like(prefix)}%', escape='\\')
+        query = query.filter(contains).order_by(case((starts_with, 0), else_=1), Item.name)
+
+    results = [tuple(row) for row in query.limit(limit).all()]
+    cache.set(key, results)
+    return results
+
+
+write_tracking.clear_on_commit('autocomplete', (Item, ItemLocation, Location, Level, Module), cache.clear)
@@ -0,0 +1,120 @@
+"""
+Dashboard statistics.
+
+All totals, the occupancy percentage and the per-module summaries come
+from one aggregate query over the denormalized counters, so its cost does
+not grow with the number of locations or items. The result is cached for
+TTL seconds and dropped as soon as a write to the inventory is committed.
+"""
+
+import threading
+import time
+from sqlalchemy import func, select, true
+from app.models import db, Module, Level, Location, Item, ItemLocation
+from app.services import write_tracking
+
+TTL = 30
+
+
+class StatsCache:
+    """Single cached value with a TTL"""
+
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self._value = None
+        self._stored_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._stored_at <= self.ttl:
+                return self._value
+            return None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._stored_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+
+
+cache = StatsCache()
+
+
+def _percent(part, whole):
+    return round(100.0 * part / whole, 1) if whole else 0.0
+
+
+def _query():
+    totals = select(func.count(Item.id).label('item_count')).subquery()
+    per_module = (
+        select(
+            Module.id, Module.name, Module.description,
+            Module.level_count, Module.location_count,
+            func.coalesce(func.sum(Level.occupied_count), 0).label('occupied_count'),
+        )
+        .outerjoin(Level, Level.module_id == Module.id)
+        .group_by(Module.id)
+        .subquery()
+    )
+    # Joined on true so the item total comes back even with no modules
+    return (
+        select(totals.c.item_count, per_module)
+        .select_from(totals.outerjoin(per_module, true()))
+        .order_by(per_module.c.name)
+    )
+
+
+def compute_stats():
+    """Totals and per-module summaries in one query"""
+    rows = db.session.execute(_query()).all()
+    modules = [
+        {
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'level_count': row.level_count,
+            'location_count': row.location_count,
+            'occupied_count': row.occupied_count,
+            'occupancy_pct': _percent(row.occupied_count, row.location_count),
+        }
+        for row in rows if row.id is not None
+    ]
+    locations = sum(m['location_count'] for m in modules)
+    occupied = sum(m['occupied_count'] for m in modules)
+    return {
+        'modules': len(modules),
+        'levels': sum(m['level_count'] for m in modules),
+        'locations': locations,
+        'occupied': occupied,
+        'occupancy_pct': _percent(occupied, locations),
+        'items': rows[0].item_count if rows else 0,
+        'module_summaries': modules,
+    }
+
+
+def get_stats():
+    """Cached dashboard statistics"""
+    stats = cache.get()
+    if stats is None:
+        stats = compute_stats()
+        cache.set(stats)
+    return stats
+
+
+def recent_items(limit=10):
+    """Newest items with their placement counts, in one query"""
+    return (
+        db.session.query(Item, func.count(ItemLocation.id).label('placement_count'))
+        .outerjoin(ItemLocation, ItemLocation.item_id == Item.id)
+        .group_by(Item.id)
+        .order_by(Item.created_at.desc(), Item.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+write_tracking.clear_on_commit('dashboard', (Item, ItemLocation, Location, Level, Module), cache.clear)
@@ -0,0 +1,179 @@
+"""
+Synthetic inventory datasets for benchmarks and load tests.
+
+Builds modules, levels and full location grids, then items with realistic
+names, descriptions, tags and metadata placed in random bins. Grids go
+through the bulk grid service and items through the bulk importer (COPY on
+PostgreSQL), so a large preset is minutes rather than hours. Output is
+deterministic for a given seed.
+"""
+
+import random
+import time
+from app.models import db, Module, Level
+from app.services.grid import create_locations_for_level, row_labels, column_labels
+from app.services.importer import import_records, DEFAULT_BATCH_SIZE
+
+# modules, levels per module, rows, columns, items
+PRESETS = {
+    'tiny': (3, 4, 4, 6, 200),
+    'small': (10, 10, 8, 10, 10000),
+    'medium': (40, 25, 10, 10, 50000),
+    'large': (100, 50, 10, 10, 200000),
+}
+
+MODULE_NAMES = (
+    'Zeus', 'Hera', 'Apollo', 'Athena', 'Ares', 'Artemis', 'Hermes', 'Hestia',
+    'Demeter', 'Poseidon', 'Hades', 'Dionysus', 'Muse', 'Atlas', 'Helios', 'Selene',
+)
+LEVEL_KINDS = ('Drawer', 'Shelf', 'Tray', 'Bin row')
+
+RESISTANCES = ('10R', '47R', '100R', '220R', '330R', '1k', '2.2k', '4.7k', '10k', '47k', '100k', '1M')
+CAPACITANCES = ('10pF', '100pF', '1nF', '10nF', '100nF', '1uF', '4.7uF', '10uF', '47uF', '100uF', '470uF')
+PACKAGES = ('0402', '0603', '0805', '1206', 'THT')
+CHIPS = (
+    ('NE555', 'timer'), ('LM7805', 'voltage regulator'), ('ATmega328P', 'microcontroller'),
+    ('ESP32-WROOM', 'WiFi module'), ('LM358', 'op-amp'), ('74HC595', 'shift register'),
+    ('AMS1117-3.3', 'LDO regulator'), ('CH340G', 'USB serial bridge'), ('MOSFET IRLZ44N', 'logic-level MOSFET'),
+)
+THREADS = ('M2', 'M2.5', 'M3', 'M4', 'M5', 'M6', 'M8')
+HEADS = ('socket head cap', 'button head', 'flat head', 'pan head', 'hex head')
+MATERIALS = ('stainless steel', 'zinc plated steel', 'black oxide', 'nylon', 'brass')
+TOOLS = ('screwdriver set', 'flush cutters', 'needle nose pliers', 'wire strippers', 'crimping tool',
+         'hex key set', 'digital caliper', 'soldering iron tips', 'deburring tool', 'tap and die set')
+COLORS = ('red', 'black', 'white', 'blue', 'green', 'yellow', 'silver', 'orange')
+
+
+def _electronics(rng):
+    kind = rng.random()
+    if kind < 0.4:
+        value, package = rng.choice(RESISTANCES), rng.choice(PACKAGES)
+        tolerance = rng.choice(('1%', '5%'))
+        return (
+            f'{value} {package} resistor', f'{value} ohm {tolerance} {package} resistor, {rng.choice((100, 250, 500, 1000))} pack',
+            'smd_component' if package != 'THT' else 'solid', ['resistor', package.lower(), 'passive'],
+            {'value': value, 'package': package, 'tolerance': tolerance},
+        )
+    if kind < 0.75:
+        value, package = rng.choice(CAPACITANCES), rng.choice(PACKAGES)
+        voltage = rng.choice(('6.3V', '16V', '25V', '50V'))
+        return (
+            f'{value} {voltage} capacitor', f'{value} {voltage} {rng.choice(("X7R", "C0G", "electrolytic"))} capacitor, {package}',
+            'smd_component' if package != 'THT' else 'solid', ['capacitor', package.lower(), 'passive'],
+            {'value': value, 'voltage': voltage, 'package': package},
+        )
+    part, role = rng.choice(CHIPS)
+    return (
+        part, f'{part} {role}, {rng.choice(("DIP", "SOIC", "SOT-223", "module"))} package',
+        'solid', ['ic', role.split()[-1]], {'part_number': part, 'function': role},
+    )
+
+
+def _fasteners(rng):
+    thread, head, material = rng.choice(THREADS), rng.choice(HEADS), rng.choice(MATERIALS)
+    kind = rng.random()
+    if kind < 0.6:
+        length = rng.choice((4, 6, 8, 10, 12, 16, 20, 25, 30, 40))
+        return (
+            f'{thread}x{length} {head} screw', f'{thread} x {length}mm {head} screw, {material}',
+            'bulk', ['screw', thread.lower(), 'metric'],
+            {'thread': thread, 'length_mm': length, 'head': head, 'material': material},
+        )
+    part = 'nut' if kind < 0.8 else 'washer'
+    return (
+        f'{thread} {part}', f'{thread} {material} {part}s', 'bulk', [part, thread.lower(), 'metric'],
+        {'thread': thread, 'material': material},
+    )
+
+
+def _tools(rng):
+    tool = rng.choice(TOOLS)
+    return (tool.capitalize(), f'{tool.capitalize()}, {rng.choice(("Wera", "Knipex", "Wiha", "Engineer", "iFixit"))}',
+            'solid', ['tool', tool.split()[-1]], {'brand_tier': rng.choice(('hobby', 'pro'))})
+
+
+def _paints(rng):
+    color = rng.choice(COLORS)
+    volume = rng.choice((30, 100, 250, 400))
+    finish = rng.choice(('matte', 'gloss', 'satin'))
+    return (f'{color.capitalize()} {finish} paint', f'{color} {finish} acrylic paint, {volume}ml',
+            'liquid', ['paint', color, finish], {'color': color, 'volume_ml': volume, 'finish': finish})
+
+
+CATEGORIES = (('Electronics', _electronics, 0.5), ('Fasteners', _fasteners, 0.3),
+              ('Tools', _tools, 0.1), ('Paints', _paints, 0.1))
+
+
+def _item_record(rng, address_of, serial):
+    pick, total = rng.random(), 0.0
+    for category, make, weight in CATEGORIES:
+        total += weight
+        if pick <= total:
+            break
+    name, description, item_type, tags, metadata = make(rng)
+    placements = {address_of(rng) for _ in range(1 if rng.random() < 0.85 else 2)}
+    return {
+        'name': name,
+        'description': description,
+        'category': category,
+        'item_type': item_type,
+        'tags': ','.join(tags),
+        'notes': f'Batch {serial % 97}' if rng.random() < 0.2 else None,
+        'item_metadata': metadata,
+        'locations': sorted(placements),
+    }
+
+
+def module_name(index):
+    base = MODULE_NAMES[index % len(MODULE_NAMES)]
+    return base if index < len(MODULE_NAMES) else f'{base}-{index // len(MODULE_NAMES)}'
+
+
+def generate(modules, levels, rows, columns, items, seed=0, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Write a synthetic dataset into the database and return its counts.
+
+    Module names must not exist yet. ``progress`` is called with a message
+    after each module and each committed item batch.
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    names = [module_name(i) for i in range(modules)]
+    row_names, column_names = row_labels(rows), column_labels(columns)
+
+    for index, name in enumerate(names):
+        module = Module(
+            name=name,
+            description=f'{rng.choice(("Parts", "Hardware", "Tool", "Supply"))} cabinet {index + 1}',
+            location_description=f'{rng.choice(("North", "East", "South", "West"))} wall, bay {index % 12 + 1}',
+        )
+        db.session.add(module)
+        db.session.flush()
+        for number in range(1, levels + 1):
+            level = Level(module_id=module.id, level_number=number, rows=rows, columns=columns,
+                          name=f'{rng.choice(LEVEL_KINDS)} {number}')
+            db.session.add(level)
+            db.session.flush()
+            create_locations_for_level(level)
+        db.session.commit()
+        if progress:
+            progress(f'module {index + 1}/{modules} ({name})')
+
+    def address_of(rng):
+        return (f'{rng.choice(names)}:{rng.randint(1, levels)}:'
+                f'{rng.choice(row_names)}{rng.choice(column_names)}')
+
+    records = ((serial, _item_record(rng, address_of, serial)) for serial in range(1, items + 1))
+    report = import_records(
+        records, batch_size,
+        (lambda r: progress(f'{r.items}/{items} items ({r.rows_per_second:.0f} rows/s)')) if progress else None,
+    )
+    return {
+        'modules': modules,
+        'levels': modules * levels,
+        'locations': modules * levels * rows * columns,
+        'items': report.items,
+        'placements': report.placements,
+        'failed': report.failed,
+        'seconds': round(time.monotonic() - started, 1),
+    }
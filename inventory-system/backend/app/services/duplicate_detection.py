@@ -0,0 +1,304 @@
+"""
+Near-duplicate item detection with MinHash and locality-sensitive hashing.
+
+Each item's name and description become a set of shingles (tokens, with
+values like "10k" or "m3x10" kept whole and weighted up, plus name token
+pairs) and a MinHash signature of NUM_PERM 16-bit values. The signature is cut into BANDS bands;
+items sharing any band land in the same bucket and are candidates, which
+are then checked against the estimated Jaccard similarity. Lookups touch a
+handful of buckets instead of every item, and the cluster report is linear
+in the number of items.
+
+Buckets are sorted NumPy arrays per band, built in one pass; items created
+or edited afterwards go to a small overflow dict that is merged back once
+it grows. Lookups also pick up items other workers inserted (ids above the
+highest one indexed); edits and deletions made elsewhere are seen at the
+next rebuild, every REBUILD_TTL seconds.
+"""
+
+import threading
+import time
+import zlib
+import numpy as np
+from sqlalchemy import select
+from app.models import db, Item
+from app.services import write_tracking
+from app.services.tokens import tokens
+
+NUM_PERM = 64
+ROWS_PER_BAND = 4  # 16-bit values, so one band packs into a uint64
+BANDS = NUM_PERM // ROWS_PER_BAND
+THRESHOLD = 0.6  # estimated Jaccard similarity of a duplicate
+REBUILD_TTL = 1800
+MERGE_AT = 2000  # overflow items before the sorted buckets are rebuilt
+DEFAULT_LIMIT = 5
+
+# Multiply-add-shift hash family: (a * x + b) mod 2**64, top 32 bits
+_rng = np.random.default_rng(20240101)
+_A = (_rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) << np.uint64(1) | np.uint64(1))[:, None]
+_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)[:, None]
+_SHIFT = np.uint64(32)
+_CHUNK = 50000  # shingles hashed per step of a bulk build
+
+# Copies of each value token in the name ("10k", "m3x10"), so parts that
+# differ only in value or size are not reported as duplicates
+VALUE_WEIGHT = 4
+
+
+def shingles(name, description):
+    """Name tokens and token pairs, weighted value tokens, and description tokens"""
+    words = tokens(name)
+    result = set(words) | {f'{a} {b}' for a, b in zip(words, words[1:])}
+    for word in words:
+        if any(c.isdigit() for c in word):
+            result.update(f'{word}#{copy}' for copy in range(1, VALUE_WEIGHT))
+    result.update(tokens(description))
+    return result
+
+
+def signatures(texts):
+    """MinHash signatures (len(texts) x NUM_PERM, uint16) of (name, description) pairs"""
+    known = {}  # most shingles repeat across items
+
+    def crc(shingle):
+        value = known.get(shingle)
+        if value is None:
+            value = known[shingle] = zlib.crc32(shingle.encode())
+        return value
+
+    hashed = [[crc(s) for s in shingles(name, description)] or [0] for name, description in texts]
+    result = np.empty((len(hashed), NUM_PERM), dtype=np.uint16)
+    start = 0
+    while start < len(hashed):
+        # Whole items per chunk so reduceat sees complete shingle runs
+        end, size = start, 0
+        while end < len(hashed) and (size < _CHUNK or end == start):
+            size += len(hashed[end])
+            end += 1
+        flat = np.fromiter((h for item in hashed[start:end] for h in item), dtype=np.uint64, count=size)
+        offsets = np.cumsum([0] + [len(item) for item in hashed[start:end - 1]])
+        permuted = (_A * flat + _B) >> _SHIFT
+        # Keeping the low 16 bits of each minimum halves memory at a negligible collision rate
+        result[start:end] = np.minimum.reduceat(permuted, offsets, axis=1).T.astype(np.uint16)
+        start = end
+    return result
+
+
+def _band_keys(signature_rows):
+    return np.ascontiguousarray(signature_rows).view(np.uint64)
+
+
+class DuplicateIndex:
+    """MinHash signatures of every item, bucketed by band"""
+
+    def __init__(self, ttl=REBUILD_TTL):
+        self.ttl = ttl
+        self.built_at = None
+        self.max_id = 0
+        self._lock = threading.Lock()
+        self._rebuild = True
+        self._pending = {}  # item id -> (name, description), None when deleted
+
+    # Change tracking
+
+    def invalidate(self):
+        with self._lock:
+            self._rebuild = True
+
+    def record(self, changes):
+        with self._lock:
+            self._pending.update(changes)
+
+    def _ensure_current(self):
+        expired = self.built_at is None or time.monotonic() - self.built_at > self.ttl
+        if self._rebuild or expired:
+            self._build()
+            return
+        rows = db.session.connection().execute(
+            select(Item.id, Item.name, Item.description).where(Item.id > self.max_id).order_by(Item.id)
+        ).all()
+        changes, self._pending = self._pending, {}
+        changes.update((row.id, (row.name, row.description)) for row in rows)
+        if changes:
+            self._apply(changes)
+
+    # Loading
+
+    def _build(self):
+        rows = db.session.connection().execute(
+            select(Item.id, Item.name, Item.description).order_by(Item.id)
+        ).all()
+        self.ids = np.array([row.id for row in rows], dtype=np.int64)
+        self.signatures = signatures([(row.name, row.description) for row in rows])
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.max_id = int(self.ids[-1]) if len(rows) else 0
+        self._sort_buckets()
+        self._pending.clear()
+        self._rebuild = False
+        self.built_at = time.monotonic()
+
+    def _sort_buckets(self):
+        keys = _band_keys(self.signatures)
+        self.bucket_rows = [np.argsort(keys[:, band], kind='stable').astype(np.int32) for band in range(BANDS)]
+        self.bucket_keys = [keys[rows, band] for band, rows in enumerate(self.bucket_rows)]
+        self.overflow = {}
+        self.overflow_items = 0
+
+    def _row(self, item_id):
+        row = int(np.searchsorted(self.ids, item_id))
+        return row if row < len(self.ids) and self.ids[row] == item_id else None
+
+    def _apply(self, changes):
+        new = sorted(item_id for item_id, text in changes.items()
+                     if text is not None and item_id > self.max_id)
+        if new and len(new) > MERGE_AT:
+            self._build()
+            return
+        edited = [(item_id, text) for item_id, text in changes.items()
+                  if text is not None and item_id <= self.max_id]
+
+        if new:
+            self.ids = np.concatenate([self.ids, np.array(new, dtype=np.int64)])
+            self.signatures = np.concatenate([self.signatures, np.zeros((len(new), NUM_PERM), np.uint16)])
+            self.alive = np.concatenate([self.alive, np.ones(len(new), dtype=bool)])
+            self.max_id = new[-1]
+
+        updates = [(self._row(item_id), text) for item_id, text in edited]
+        updates = [(row, text) for row, text in updates if row is not None]
+        updates += [(self._row(item_id), changes[item_id]) for item_id in new]
+        if updates:
+            rows = np.array([row for row, _ in updates])
+            self.signatures[rows] = signatures([text for _, text in updates])
+            self.alive[rows] = True
+            # Old bucket entries of edited items fail verification against the new signature
+            for row, keys in zip(rows.tolist(), _band_keys(self.signatures[rows])):
+                for band, key in enumerate(keys.tolist()):
+                    self.overflow.setdefault((band, key), []).append(row)
+            self.overflow_items += len(updates)
+
+        for item_id, text in changes.items():
+            row = self._row(item_id) if text is None else None
+            if row is not None:
+                self.alive[row] = False
+
+        if self.overflow_items > MERGE_AT:
+            self._sort_buckets()
+
+    # Queries
+
+    def _candidate_rows(self, signature):
+        keys = _band_keys(signature[None, :])[0]
+        found = []
+        for band, key in enumerate(keys.tolist()):
+            sorted_keys = self.bucket_keys[band]
+            start = np.searchsorted(sorted_keys, key, 'left')
+            end = np.searchsorted(sorted_keys, key, 'right')
+            if end > start:
+                found.append(self.bucket_rows[band][start:end])
+            extra = self.overflow.get((band, key))
+            if extra:
+                found.append(np.array(extra, dtype=np.int32))
+        if not found:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def similar(self, name, description, threshold=THRESHOLD, limit=DEFAULT_LIMIT, exclude_id=None):
+        """(item id, estimated similarity) of likely duplicates, most similar first"""
+        signature = signatures([(name, description)])[0]
+        with self._lock:
+            self._ensure_current()
+            if not len(self.ids):
+                return []
+            rows = self._candidate_rows(signature)
+            rows = rows[self.alive[rows]]
+            similarity = (self.signatures[rows] == signature).mean(axis=1)
+            keep = similarity >= threshold
+            rows, similarity = rows[keep], similarity[keep]
+            order = np.lexsort((self.ids[rows], -similarity))
+            results = [(int(self.ids[row]), round(float(similarity[i]), 3))
+                       for i, row in zip(order.tolist(), rows[order].tolist())]
+        return [(item_id, score) for item_id, score in results if item_id != exclude_id][:limit]
+
+    def clusters(self, threshold=THRESHOLD, min_size=2):
+        """
+        Groups of item ids that are near-duplicates of each other, largest first.
+
+        Each bucket member is compared with the bucket's first item only, so
+        the work is linear in items x bands. Links are taken most similar
+        first, and two groups merge only if their first items are similar
+        too, so chains of borderline links do not snowball into one group.
+        """
+        with self._lock:
+            self._ensure_current()
+            if self.overflow:
+                self._sort_buckets()
+            pairs = []
+            for band in range(BANDS):
+                rows = self.bucket_rows[band][self.alive[self.bucket_rows[band]]]
+                keys = _band_keys(self.signatures[rows])[:, band]
+                if len(rows) < 2:
+                    continue
+                starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+                leaders = np.repeat(rows[starts], np.diff(np.r_[starts, len(rows)]))
+                linked = leaders != rows
+                pairs.append(np.stack([leaders[linked], rows[linked]], axis=1))
+            if not pairs:
+                return []
+            pairs = np.unique(np.concatenate(pairs), axis=0)
+            similarity = (self.signatures[pairs[:, 0]] == self.signatures[pairs[:, 1]]).mean(axis=1)
+            keep = similarity >= threshold
+            pairs = pairs[keep][np.argsort(-similarity[keep], kind='stable')]
+            ids, signatures_ = self.ids, self.signatures
+
+        parent = {}
+
+        def find(row):
+            root = row
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while row != root:
+                parent[row], row = root, parent.get(row, row)
+            return root
+
+        for a, b in pairs.tolist():
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b:
+                continue
+            if root_a != a or root_b != b:
+                if (signatures_[root_a] == signatures_[root_b]).mean() < threshold:
+                    continue
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        groups = {}
+        for row in set(pairs.ravel().tolist()):
+            groups.setdefault(find(row), []).append(int(ids[row]))
+        clusters = [sorted(members) for members in groups.values() if len(members) >= min_size]
+        return sorted(clusters, key=lambda c: (-len(c), c[0]))
+
+
+index = DuplicateIndex()
+
+
+def find_duplicates(name, description, limit=DEFAULT_LIMIT, exclude_id=None):
+    """Likely duplicates of an item's text as (Item, similarity) pairs, best first"""
+    matches = index.similar(name, description, limit=limit, exclude_id=exclude_id)
+    if not matches:
+        return []
+    from app.services.loading import profile
+    items = {
+        item.id: item
+        for item in Item.query.options(*profile('item_row')).filter(Item.id.in_([i for i, _ in matches]))
+    }
+    # Items deleted by another worker are gone from the database already
+    return [(items[item_id], similarity) for item_id, similarity in matches if item_id in items]
+
+
+# Write tracking
+
+def _track_writes(session, changes):
+    for obj in write_tracking.written(session):
+        if isinstance(obj, Item):
+            changes[obj.id] = None if obj in session.deleted else (obj.name, obj.description)
+
+
+write_tracking.register('duplicate_index', _track_writes, index.record)
@@ -0,0 +1,194 @@
+"""
+Location grid generation and occupancy for levels.
+
+Cells are written with set-based statements instead of one ORM object per
+bin: on PostgreSQL a whole grid is a single INSERT ... SELECT over unnest()
+of the row and column labels. Resizing a level only touches the cells on the
+edges that changed, so existing bins keep their ids, properties and items.
+The counter columns maintained in app.models are adjusted here directly,
+since these statements bypass the ORM events.
+
+A level's occupancy (level_occupancy) comes from one query over its
+locations' item counters and is cached per level until a location or
+placement write in that level, or any hierarchy write, invalidates it.
+"""
+
+from itertools import product
+from sqlalchemy import String, bindparam, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.models import db, Location, ItemLocation, adjust_location_counts, address_prefix, cell_label
+from app.services.hierarchy import pack_bits
+from app.services.response_cache import cache
+
+locations_t = Location.__table__
+item_locations_t = ItemLocation.__table__
+
+
+def row_labels(rows):
+    """Row labels: A, B, C... or 1, 2, 3... once there are more than 26 rows"""
+    return [chr(65 + i) for i in range(rows)] if rows <= 26 else [str(i + 1) for i in range(rows)]
+
+
+def column_labels(columns):
+    """Column labels: 1, 2, 3..."""
+    return [str(i + 1) for i in range(columns)]
+
+
+def grid_cells(rows, columns):
+    """All (row, column) label pairs of a rows x columns grid"""
+    return list(product(row_labels(rows), column_labels(columns)))
+
+
+def _insert_cells(level, cells):
+    """Insert locations for (row, column) cells in as few statements as possible"""
+    if not cells:
+        return
+    prefix = address_prefix(level.module.name, level.level_number)
+
+    if db.engine.dialect.name == 'postgresql':
+        cell_rows, cell_columns = zip(*cells)
+        labels = func.unnest(
+            literal(list(cell_rows), ARRAY(String)),
+            literal(list(cell_columns), ARRAY(String)),
+            literal([prefix + cell_label(row, column) for row, column in cells], ARRAY(String)),
+        ).table_valued('row', 'column', 'address')
+        db.session.execute(
+            insert(locations_t).from_select(
+                ['level_id', 'row', 'column', 'location_type', 'address'],
+                select(
+                    literal(level.id), labels.c.row, labels.c.column, literal('general'),
+                    labels.c.address,
+                ),
+            )
+        )
+    else:
+        db.session.execute(insert(locations_t), [
+            {
+                'level_id': level.id, 'row': row, 'column': column,
+                'location_type': 'general', 'address': prefix + cell_label(row, column),
+            }
+            for row, column in cells
+        ])
+
+
+def create_locations_for_level(level):
+    """Create every location of a new level's grid; the caller commits"""
+    cells = grid_cells(level.rows, level.columns)
+    _insert_cells(level, cells)
+    adjust_location_counts(db.session.connection(), level.id, len(cells))
+    db.session.expire(level, ['locations', 'location_count', 'occupied_count'])
+    return len(cells)
+
+
+def _label_index(label, lettered):
+    """0-based position of a row ('B' or '2') or column ('2') label, None if unparseable"""
+    if label.isdigit():
+        return int(label) - 1
+    if lettered and len(label) == 1 and 'A' <= label <= 'Z':
+        return ord(label) - 65
+    return None
+
+
+def resize_level_grid(level):
+    """
+    Bring a level's locations in line with its rows and columns.
+
+    Cells are matched by row and column position, not label, so bins keep
+    their ids, properties and items even when rows switch from letters to
+    numbers (past 26 rows) and are relabeled. Only cells outside the new
+    grid are deleted (with their item assignments) and only missing cells
+    are inserted. Returns the number of (added, removed) locations; the
+    caller commits.
+    """
+    new_rows = row_labels(level.rows)
+    new_columns = column_labels(level.columns)
+    prefix = address_prefix(level.module.name, level.level_number)
+
+    kept, relabeled, outside, removed_occupied = set(), [], [], 0
+    cells = db.session.execute(
+        select(Location.id, Location.row, Location.column, Location.item_count)
+        .where(Location.level_id == level.id).order_by(Location.id)
+    )
+    for location_id, row, column, item_count in cells:
+        position = (_label_index(row, lettered=True), _label_index(column, lettered=False))
+        inside = None not in position and position[0] < level.rows and position[1] < level.columns
+        if not inside or position in kept:
+            outside.append(location_id)
+            removed_occupied += item_count > 0
+            continue
+        kept.add(position)
+        label = (new_rows[position[0]], new_columns[position[1]])
+        if label != (row, column):
+            relabeled.append({
+                'location_id': location_id, 'new_row': label[0], 'new_column': label[1],
+                'new_address': prefix + cell_label(*label),
+            })
+
+    if outside:
+        db.session.execute(
+            item_locations_t.delete().where(item_locations_t.c.location_id.in_(outside))
+        )
+        db.session.execute(locations_t.delete().where(locations_t.c.id.in_(outside)))
+    if relabeled:
+        db.session.connection().execute(
+            locations_t.update().where(locations_t.c.id == bindparam('location_id')).values(
+                row=bindparam('new_row'), column=bindparam('new_column'),
+                address=bindparam('new_address'),
+            ),
+            relabeled,
+        )
+        moved = {cell['location_id'] for cell in relabeled}
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, Location) and obj.id in moved:
+                db.session.expire(obj, ['row', 'column', 'address'])
+
+    added = [
+        (new_rows[r], new_columns[c])
+        for r, c in product(range(level.rows), range(level.columns)) if (r, c) not in kept
+    ]
+    _insert_cells(level, added)
+
+    if added or outside:
+        adjust_location_counts(
+            db.session.connection(), level.id, len(added) - len(outside), occupied=-removed_occupied
+        )
+    if added or outside or relabeled:
+        db.session.expire(level, ['locations', 'location_count', 'occupied_count'])
+    return len(added), len(outside)
+
+
+def _occupancy(level):
+    rows, columns = row_labels(level.rows), column_labels(level.columns)
+    position = {cell: i for i, cell in enumerate(product(rows, columns))}
+    location_ids = [None] * len(position)
+    item_counts = [0] * len(position)
+    cells = db.session.execute(
+        select(Location.id, Location.row, Location.column, Location.item_count)
+        .where(Location.level_id == level.id)
+    )
+    for location_id, row, column, item_count in cells:
+        i = position.get((row, column))
+        if i is not None:
+            location_ids[i], item_counts[i] = location_id, item_count
+    return {
+        'level_id': level.id,
+        'rows': rows,
+        'columns': columns,
+        'location_ids': location_ids,
+        'item_counts': item_counts,
+        'occupied': pack_bits([count > 0 for count in item_counts]),
+        'occupied_count': sum(1 for count in item_counts if count),
+    }
+
+
+def level_occupancy(level):
+    """
+    Occupancy of a level's grid as parallel row-major cell arrays.
+
+    ``location_ids`` (None for a missing cell) and ``item_counts`` have one
+    entry per cell, ``occupied`` is the same as a base64 bitmap, most
+    significant bit first.
+    """
+    return cache.memoize(
+        f'level-occupancy:{level.id}', ['hierarchy', f'locations:{level.id}'], lambda: _occupancy(level)
+    )
@@ -0,0 +1,94 @@
+"""
+The whole Module -> Level -> Location tree in one compact, columnar payload.
+
+The location picker loads it once and then selects modules, levels and
+locations without further requests. Each table is a set of parallel arrays;
+children are contiguous, so ``modules.levels[i]:modules.levels[i + 1]``
+slices the levels of module i, and likewise ``levels.locations`` the
+locations of a level. Occupancy is a bitmap with one bit per location, most
+significant bit first, base64 encoded::
+
+    {"revision": 42,
+     "modules": {"id": [...], "name": [...], "levels": [0, 3, ...]},
+     "levels": {"id": [...], "number": [...], "name": [...], "locations": [0, 80, ...]},
+     "locations": {"id": [...], "label": ["A1", ...], "occupied": "8PA..."}}
+
+A location's address is "<module name>:<level number>:<label>". The payload
+is versioned by the hierarchy revision from app.models, which every module,
+level, location and placement write bumps, and is cached per revision.
+"""
+
+import base64
+import json
+from itertools import accumulate
+from sqlalchemy import func, select
+from app.models import db, Module, Level, Location, cell_label, current_revision
+from app.services.response_cache import cache
+
+
+def revision():
+    """Current hierarchy revision"""
+    return current_revision(db.session.connection())
+
+
+def pack_bits(bits):
+    """Base64 of bits packed eight to a byte, most significant bit first"""
+    import numpy as np  # not loaded at app startup
+    return base64.b64encode(np.packbits(np.asarray(bits, dtype=bool)).tobytes()).decode()
+
+
+def _offsets(parent_ids, child_parents):
+    """Start of each parent's run of children, plus the end of the last"""
+    position = {parent: i for i, parent in enumerate(parent_ids)}
+    counts = [0] * len(parent_ids)
+    for parent in child_parents:
+        counts[position[parent]] += 1
+    return list(accumulate(counts, initial=0))
+
+
+def tree(revision_number):
+    """The columnar tree (see the module docstring)"""
+    connection = db.session.connection()
+    modules = connection.execute(select(Module.id, Module.name).order_by(Module.name, Module.id)).all()
+    module_order = {row.id: i for i, row in enumerate(modules)}
+
+    levels = connection.execute(select(Level.id, Level.module_id, Level.level_number, Level.name)).all()
+    levels.sort(key=lambda row: (module_order[row.module_id], row.level_number, row.id))
+    level_order = {row.id: i for i, row in enumerate(levels)}
+
+    # Labels are single letters or numbers; ordering by length first keeps 2 before 10
+    locations = connection.execute(
+        select(Location.id, Location.level_id, Location.row, Location.column, Location.item_count > 0)
+        .order_by(func.length(Location.row), Location.row, func.length(Location.column), Location.column, Location.id)
+    ).all()
+    locations.sort(key=lambda row: level_order[row.level_id])  # stable: keeps the grid order
+
+    return {
+        'revision': revision_number,
+        'modules': {
+            'id': [row.id for row in modules],
+            'name': [row.name for row in modules],
+            'levels': _offsets([row.id for row in modules], [row.module_id for row in levels]),
+        },
+        'levels': {
+            'id': [row.id for row in levels],
+            'number': [row.level_number for row in levels],
+            'name': [row.name for row in levels],
+            'locations': _offsets([row.id for row in levels], [row.level_id for row in locations]),
+        },
+        'locations': {
+            'id': [row.id for row in locations],
+            'label': [cell_label(row.row, row.column) for row in locations],
+            'occupied': pack_bits([row[4] for row in locations]),
+        },
+    }
+
+
+def tree_json(revision_number):
+    """Encoded tree of a revision, built once per revision"""
+    key = f'hierarchy-tree:{revision_number}'
+    body = cache.get(key)
+    if body is None:
+        body = json.dumps(tree(revision_number), separators=(',', ':')).encode()
+        cache.set(key, body)
+    return body
@@ -0,0 +1,420 @@
+"""
+Streaming bulk import of items, placements and the storage hierarchy.
+
+Input is CSV (with a header row) or JSON Lines and is read one record at a
+time, so memory use does not grow with the file. Each record has a ``kind``:
+
+- ``module``: name, description, location_description
+- ``level``: module, level_number, name, rows, columns, description
+- ``item`` (the default): name, description, category, item_type, tags,
+  notes, item_metadata and locations, a list of addresses like
+  ``Zeus:3:B4`` (``;`` separated in CSV)
+
+Items are written in batches, one transaction per batch. Addresses in a
+batch are resolved in a single query, and on PostgreSQL rows are loaded
+with COPY into ids pre-allocated from the sequences. Rows that fail
+validation are skipped and reported with their line number.
+"""
+
+import csv
+import io
+import json
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import insert, text
+from sqlalchemy.exc import SQLAlchemyError
+from app.models import db, Module, Level, Location, Item, ItemLocation, ItemTag, normalize_tags, bump_revision
+from app.services import autocomplete, dashboard, response_cache
+from app.services.grid import create_locations_for_level
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+ITEM_FIELDS = ('name', 'description', 'category', 'item_type', 'tags', 'notes', 'item_metadata')
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported"""
+
+
+class ImportReport:
+    """Counts, per-row errors and throughput of an import run"""
+
+    def __init__(self):
+        self.rows = 0
+        self.modules = 0
+        self.levels = 0
+        self.items = 0
+        self.placements = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'modules': self.modules,
+            'levels': self.levels,
+            'items': self.items,
+            'placements': self.placements,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def read_records(stream, fmt):
+    """Yield (line_number, record dict) from a text stream of CSV or JSONL"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt in ('jsonl', 'ndjson'):
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, RecordError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield line_number, RecordError('Expected a JSON object')
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def parse_address(address):
+    """Validate and normalize an address like 'Zeus:3:B4'"""
+    parts = address.strip().rsplit(':', 2)
+    if len(parts) != 3 or not parts[0] or not parts[2]:
+        raise RecordError(f'Invalid address "{address}", expected Module:Level:RowColumn')
+    try:
+        level_number = int(parts[1])
+    except ValueError:
+        raise RecordError(f'Invalid level number in address "{address}"')
+    return f'{parts[0]}:{level_number}:{parts[2]}'
+
+
+def _blank(value):
+    return None if value is None or (isinstance(value, str) and not value.strip()) else value
+
+
+def _fits(field, value, column):
+    """value, checked against the length of the column it is stored in"""
+    length = column.type.length
+    if value is not None and length and len(value) > length:
+        raise RecordError(f'{field} is longer than {length} characters')
+    return value
+
+
+def _text(record, field, column=None):
+    """A string field of record, None when blank"""
+    value = _blank(record.get(field))
+    if value is not None and not isinstance(value, str):
+        raise RecordError(f'{field} must be a string')
+    return _fits(field, value, column) if column is not None else value
+
+
+def _strings(record, field, separator):
+    """A list-of-strings field, given as a list or a separated string"""
+    value = _blank(record.get(field))
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(separator)
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise RecordError(f'{field} must be a string or a list of strings')
+    return [v.strip() for v in value if v.strip()]
+
+
+def _kind(record):
+    kind = _text(record, 'kind') or 'item'
+    return kind.lower()
+
+
+def _item_row(record):
+    """Validate an item record and return (column values, addresses)"""
+    columns = Item.__table__.c
+    row = {field: _text(record, field, columns[field]) for field in ITEM_FIELDS if field not in ('tags', 'item_metadata')}
+    row['tags'] = _blank(record.get('tags'))
+    if not isinstance(row['tags'], str):
+        row['tags'] = ','.join(_strings(record, 'tags', ',')) or None
+    _fits('tags', row['tags'], columns.tags)
+    if not row['name'] or not row['description']:
+        raise RecordError('Name and description are required')
+
+    metadata = _blank(record.get('item_metadata'))
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            raise RecordError('item_metadata is not valid JSON')
+    if metadata is not None and not isinstance(metadata, dict):
+        raise RecordError('item_metadata must be a JSON object')
+    row['item_metadata'] = metadata
+
+    addresses = [
+        parse_address(_fits('Location address', a, Location.__table__.c.address))
+        for a in _strings(record, 'locations', ';')
+    ]
+    return row, addresses
+
+
+def _import_module(record, report):
+    columns = Module.__table__.c
+    name = _text(record, 'name', columns.name)
+    if not name:
+        raise RecordError('Module name is required')
+    if Module.query.filter_by(name=name).first():
+        raise RecordError(f'Module "{name}" already exists')
+
+    db.session.add(Module(
+        name=name,
+        description=_text(record, 'description'),
+        location_description=_text(record, 'location_description', columns.location_description),
+    ))
+    db.session.flush()
+    report.modules += 1
+
+
+def _import_level(record, report):
+    module = Module.query.filter_by(name=_text(record, 'module')).first()
+    if module is None:
+        raise RecordError(f'Unknown module "{record.get("module")}"')
+    try:
+        level_number = int(record.get('level_number'))
+        rows = int(_blank(record.get('rows')) or 1)
+        columns = int(_blank(record.get('columns')) or 1)
+    except (TypeError, ValueError):
+        raise RecordError('level_number, rows and columns must be integers')
+    if Level.query.filter_by(module_id=module.id, level_number=level_number).first():
+        raise RecordError(f'Level {level_number} already exists in module "{module.name}"')
+
+    level = Level(
+        module_id=module.id,
+        level_number=level_number,
+        name=_text(record, 'name', Level.__table__.c.name),
+        rows=rows,
+        columns=columns,
+        description=_text(record, 'description'),
+    )
+    db.session.add(level)
+    db.session.flush()
+    create_locations_for_level(level)
+    report.levels += 1
+
+
+def _resolve(addresses):
+    """Map address -> (location id, level id, item_count) in one query"""
+    if not addresses:
+        return {}
+    rows = db.session.query(
+        Location.address, Location.id, Location.level_id, Location.item_count
+    ).filter(Location.address.in_(list(addresses)))
+    return {address: (lid, level_id, count) for address, lid, level_id, count in rows}
+
+
+def _allocate_ids(table, count):
+    """Reserve count ids from a PostgreSQL serial sequence"""
+    result = db.session.execute(
+        text("SELECT nextval(pg_get_serial_sequence(:table, 'id')) FROM generate_series(1, :count)"),
+        {'table': table, 'count': count},
+    )
+    return [row[0] for row in result]
+
+
+def _copy(table, columns, rows):
+    """Load rows into table with COPY ... FROM STDIN on the session's connection"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)  # None is written as an empty, unquoted field: NULL
+    buffer.seek(0)
+
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _write_items(rows, placements):
+    """Insert item rows, their normalized tags and placements; placements index into rows"""
+    now = datetime.utcnow()
+    for row in rows:
+        row['created_at'] = row['updated_at'] = now
+    tags = [(index, tag) for index, row in enumerate(rows) for tag in normalize_tags(row['tags'])]
+    if placements:
+        bump_revision(db.session.connection())  # location occupancy changes
+
+    if db.engine.dialect.name == 'postgresql':
+        ids = _allocate_ids('items', len(rows))
+        columns = ('id',) + ITEM_FIELDS + ('created_at', 'updated_at')
+        _copy('items', columns, (
+            [item_id] + [
+                json.dumps(row[c]) if c == 'item_metadata' and row[c] is not None else row[c]
+                for c in columns[1:]
+            ]
+            for item_id, row in zip(ids, rows)
+        ))
+        if tags:
+            _copy('item_tags', ('item_id', 'tag'), ((ids[index], tag) for index, tag in tags))
+        if placements:
+            _copy('item_locations', ('item_id', 'location_id', 'created_at', 'updated_at'), (
+                (ids[index], location_id, now, now) for index, location_id in placements
+            ))
+        return
+
+    ids = db.session.execute(
+        insert(Item).returning(Item.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    if tags:
+        db.session.execute(insert(ItemTag), [{'item_id': ids[index], 'tag': tag} for index, tag in tags])
+    if placements:
+        db.session.execute(insert(ItemLocation), [
+            {'item_id': ids[index], 'location_id': location_id, 'created_at': now, 'updated_at': now}
+            for index, location_id in placements
+        ])
+
+
+def _update_counters(resolved, placements):
+    """Apply the counter changes for new placements (bulk writes skip the ORM events)"""
+    per_location = Counter(location_id for _, location_id in placements)
+    if not per_location:
+        return
+    info = {location_id: (level_id, count) for location_id, level_id, count in resolved.values()}
+    newly_occupied = Counter(
+        info[location_id][0] for location_id in per_location if info[location_id][1] == 0
+    )
+
+    locations_t = Location.__table__
+    levels_t = Level.__table__
+    db.session.execute(
+        locations_t.update()
+        .where(locations_t.c.id == db.bindparam('location_id'))
+        .values(item_count=locations_t.c.item_count + db.bindparam('added'), updated_at=locations_t.c.updated_at),
+        [{'location_id': lid, 'added': n} for lid, n in per_location.items()],
+    )
+    if newly_occupied:
+        db.session.execute(
+            levels_t.update()
+            .where(levels_t.c.id == db.bindparam('level_id'))
+            .values(occupied_count=levels_t.c.occupied_count + db.bindparam('added'), updated_at=levels_t.c.updated_at),
+            [{'level_id': lid, 'added': n} for lid, n in newly_occupied.items()],
+        )
+
+
+def _flush_items(batch, report):
+    """Resolve, write and commit one batch of (line, row, addresses)"""
+    if not batch:
+        return
+    resolved = _resolve({a for _, _, addresses in batch for a in addresses})
+
+    rows, placements, lines = [], [], []
+    for line, row, addresses in batch:
+        missing = [a for a in addresses if a not in resolved]
+        if missing:
+            report.error(line, f'Unknown location {missing[0]}')
+            continue
+        index = len(rows)
+        rows.append(row)
+        lines.append(line)
+        for location_id in dict.fromkeys(resolved[a][0] for a in addresses):
+            placements.append((index, location_id))
+
+    if not rows:
+        return
+    try:
+        _write_items(rows, placements)
+        _update_counters(resolved, placements)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for line in lines:
+            report.error(line, f'Batch failed: {e.__class__.__name__}: {e}')
+        return
+    report.items += len(rows)
+    report.placements += len(placements)
+
+
+def import_stream(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Import records from a text stream and return an ImportReport.
+
+    ``progress`` is called with the report after every committed batch.
+    """
+    return import_records(read_records(stream, fmt), batch_size, progress)
+
+
+def import_records(records, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Import (line number, record dict) pairs; see import_stream"""
+    report = ImportReport()
+    batch = []
+
+    def flush():
+        if not batch:
+            return
+        _flush_items(batch, report)
+        batch.clear()
+        report.elapsed = time.monotonic() - report.started
+        if progress:
+            progress(report)
+
+    for line, record in records:
+        report.rows += 1
+        if isinstance(record, RecordError):
+            report.error(line, str(record))
+            continue
+
+        try:
+            kind = _kind(record)
+            if kind == 'item':
+                row, addresses = _item_row(record)
+                batch.append((line, row, addresses))
+                if len(batch) >= batch_size:
+                    flush()
+                continue
+
+            # Hierarchy records may be referenced by the items after them
+            flush()
+            if kind == 'module':
+                _import_module(record, report)
+            elif kind == 'level':
+                _import_level(record, report)
+            else:
+                raise RecordError(f'Unknown record kind "{kind}"')
+            db.session.commit()
+        except RecordError as e:
+            db.session.rollback()
+            report.error(line, str(e))
+        except SQLAlchemyError as e:
+            # e.g. a constraint the checks above do not cover
+            db.session.rollback()
+            report.error(line, f'{e.__class__.__name__}: {getattr(e, "orig", None) or e}')
+
+    flush()
+    autocomplete.cache.clear()
+    dashboard.cache.clear()
+    response_cache.cache.invalidate_all()  # counters were bulk-updated
+    from app.services import location_suggestion
+    location_suggestion.index.invalidate()
+    report.elapsed = time.monotonic() - report.started
+    return report
@@ -0,0 +1,53 @@
+"""
+Named eager-loading profiles.
+
+Each profile is the set of loader options needed to render one kind of
+payload (a ``to_dict()`` tree or a template) without lazy loads, so the
+number of queries per request stays fixed as the result size grows.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Module, Level, Location, Item, ItemLocation
+
+
+def _location_address(path):
+    """Load a location's level and module so full_address() needs no queries"""
+    return path.joinedload(Location.level).joinedload(Level.module)
+
+
+PROFILES = {
+    # Module.to_dict() and module cards; counts come from counter columns
+    'module': lambda: [],
+    # Level.to_dict()
+    'level': lambda: [
+        joinedload(Level.module),
+    ],
+    # Location.to_dict()
+    'location': lambda: [
+        joinedload(Location.level).joinedload(Level.module),
+    ],
+    # Location detail page: items stored in the location
+    'location_items': lambda: [
+        joinedload(ItemLocation.item),
+    ],
+    # Item rows in list and search pages
+    'item_row': lambda: [
+        selectinload(Item.item_locations).options(
+            _location_address(joinedload(ItemLocation.location)),
+        ),
+    ],
+    # Item.to_dict() and the item detail page
+    'item': lambda: [
+        selectinload(Item.item_locations).options(
+            _location_address(joinedload(ItemLocation.location)),
+        ),
+    ],
+}
+
+
+def profile(name):
+    """Return the loader options for a named profile, for use with query.options(*...)"""
+    try:
+        return PROFILES[name]()
+    except KeyError:
+        raise ValueError(f'Unknown loading profile: {name}')
@@ -0,0 +1,407 @@
+"""
+Storage location suggestions for new items.
+
+Every location's grid position, type, dimensions and occupancy, plus the
+bins holding each item category, are kept in compact NumPy arrays. A
+suggestion scores all candidates in one vectorized pass:
+
+- type: how well the location type suits the item type (0 excludes it,
+  e.g. no liquids in SMD boxes)
+- fit: whether the item's dimensions fit the bin, any way round, and how
+  snugly; bins without dimensions score neutral
+- proximity: same level as bins holding the item's category (closer to
+  their centre is better), or at least the same module
+- empty: free bins are preferred
+
+Committed writes mark the affected locations dirty and the next suggestion
+refreshes only those rows; new or removed locations and grid changes
+rebuild the arrays. Other worker processes do not see our commits, so the
+arrays are also rebuilt every REBUILD_TTL seconds.
+"""
+
+import threading
+import time
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import attributes
+from app.models import db, Level, Location, Item, ItemLocation
+from app.services import write_tracking
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+REBUILD_TTL = 300
+# Per-category proximity arrays kept between writes (4 bytes per location each)
+PROXIMITY_CACHE_SIZE = 8
+
+WEIGHTS = {'type': 0.35, 'fit': 0.25, 'proximity': 0.25, 'empty': 0.15}
+
+LOCATION_TYPES = (
+    'general', 'small_box', 'medium_bin', 'large_bin', 'liquid_container',
+    'smd_box', 'bulk_bin', 'tool_holder', 'other',
+)
+ITEM_TYPES = ('solid', 'liquid', 'smd_component', 'bulk', 'tool', 'other')
+TYPE_ALIASES = {'smd_container': 'smd_box', 'smd': 'smd_component'}
+
+# item type -> location type -> suitability; unlisted pairs score 0.5
+COMPATIBILITY = {
+    'solid': {'general': 0.7, 'small_box': 0.7, 'medium_bin': 0.7, 'large_bin': 0.7, 'bulk_bin': 0.5,
+              'smd_box': 0.4, 'tool_holder': 0.4, 'liquid_container': 0.2},
+    'liquid': {'liquid_container': 1.0, 'general': 0.3, 'large_bin': 0.2, 'medium_bin': 0.1,
+               'small_box': 0.0, 'smd_box': 0.0, 'bulk_bin': 0.0, 'tool_holder': 0.0},
+    'smd_component': {'smd_box': 1.0, 'small_box': 0.8, 'general': 0.5, 'medium_bin': 0.4,
+                      'large_bin': 0.2, 'bulk_bin': 0.1, 'tool_holder': 0.1, 'liquid_container': 0.0},
+    'bulk': {'bulk_bin': 1.0, 'large_bin': 0.8, 'medium_bin': 0.6, 'general': 0.5, 'small_box': 0.3,
+             'smd_box': 0.1, 'tool_holder': 0.1, 'liquid_container': 0.1},
+    'tool': {'tool_holder': 1.0, 'large_bin': 0.6, 'medium_bin': 0.5, 'general': 0.5, 'small_box': 0.3,
+             'bulk_bin': 0.2, 'smd_box': 0.1, 'liquid_container': 0.0},
+}
+
+_COMPATIBILITY = np.array([
+    [COMPATIBILITY.get(item_type, {}).get(location_type, 0.5) for location_type in LOCATION_TYPES]
+    for item_type in ITEM_TYPES
+], dtype=np.float32)
+
+# item_metadata keys read as the item's size
+DIMENSION_KEYS = ('width_mm', 'height_mm', 'depth_mm', 'length_mm')
+
+
+def _code(value, names):
+    value = (value or '').strip().lower()
+    value = TYPE_ALIASES.get(value, value)
+    return names.index(value) if value in names else len(names) - 1
+
+
+def _grid_position(label):
+    """0-based grid index of a row or column label (A, B... or 1, 2...)"""
+    if label.isdigit():
+        return int(label) - 1
+    if len(label) == 1 and label.isalpha():
+        return ord(label.upper()) - 65
+    return 0
+
+
+def _category_key(category):
+    return (category or '').strip().lower() or None
+
+
+def item_dimensions(metadata):
+    """Up to three sizes in mm from an item's metadata"""
+    if not isinstance(metadata, dict):
+        return []
+    sizes = []
+    for key in DIMENSION_KEYS:
+        try:
+            value = float(metadata[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if value > 0:
+            sizes.append(value)
+    return sorted(sizes, reverse=True)[:3]
+
+
+def _location_rows(ids=None):
+    query = (
+        select(
+            Location.id, Location.level_id, Level.module_id, Location.row, Location.column,
+            Location.location_type, Location.width_mm, Location.height_mm, Location.depth_mm,
+            Location.item_count,
+        )
+        .join(Level, Level.id == Location.level_id)
+        .order_by(Location.id)
+    )
+    if ids is not None:
+        query = query.where(Location.id.in_(ids))
+    # Core execution on the session's connection skips ORM result handling
+    return db.session.connection().execute(query).all()
+
+
+def _category_rows(location_ids=None):
+    query = (
+        select(ItemLocation.location_id, Item.category, func.count())
+        .join(Item, Item.id == ItemLocation.item_id)
+        .where(Item.category.isnot(None))
+        .group_by(ItemLocation.location_id, Item.category)
+    )
+    if location_ids is not None:
+        query = query.where(ItemLocation.location_id.in_(location_ids))
+    return db.session.connection().execute(query).all()
+
+
+class LocationIndex:
+    """Column arrays of every location, for vectorized scoring"""
+
+    def __init__(self, ttl=REBUILD_TTL):
+        self.ttl = ttl
+        self.built_at = None
+        self.size = 0
+        self._lock = threading.Lock()
+        self._rebuild = True
+        self._dirty_locations = set()
+        self._dirty_items = set()
+        self._proximity_cache = {}
+
+    # Change tracking
+
+    def invalidate(self):
+        """Rebuild everything on next use"""
+        with self._lock:
+            self._rebuild = True
+
+    def mark_dirty(self, location_ids=(), item_ids=()):
+        with self._lock:
+            self._dirty_locations.update(location_ids)
+            self._dirty_items.update(item_ids)
+
+    def _ensure_current(self):
+        expired = self.built_at is None or time.monotonic() - self.built_at > self.ttl
+        if self._rebuild or expired:
+            self._build()
+        elif self._dirty_locations or self._dirty_items:
+            self._refresh()
+
+    # Loading
+
+    def _set_location_columns(self, positions, rows):
+        _, _, _, rows_, columns, types, widths, heights, depths, counts = zip(*rows)
+        # Labels and types repeat across levels, so convert each distinct one once
+        grid = {label: _grid_position(label) for label in {*rows_, *columns}}
+        codes = {t: _code(t, LOCATION_TYPES) for t in set(types)}
+        self.row[positions] = [grid[label] for label in rows_]
+        self.column[positions] = [grid[label] for label in columns]
+        self.type_code[positions] = [codes[t] for t in types]
+        dims = np.array([widths, heights, depths], dtype=np.float32).T  # None -> nan
+        known = ~np.isnan(dims).any(axis=1)
+        self.volume[positions] = np.where(known, np.prod(np.nan_to_num(dims), axis=1), np.nan)
+        # Sorted largest first, unknown sides unconstrained
+        self.dims_sorted[positions] = -np.sort(-np.where(np.isnan(dims), np.inf, dims), axis=1)
+        self.item_count[positions] = counts
+        # Most bins have no dimensions; fit checks only look at the rest
+        self.sized = np.flatnonzero(np.isfinite(self.dims_sorted).any(axis=1))
+
+    def _add_categories(self, rows):
+        positions = self._positions([row[0] for row in rows])
+        for position, (_, category, count) in zip(positions.tolist(), rows):
+            key = _category_key(category)
+            if key:
+                bins = self.categories.setdefault(key, {})
+                bins[position] = bins.get(position, 0) + count
+
+    def _build(self):
+        rows = _location_rows()
+        size = len(rows)
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.level_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        self.module_ids = np.array([row[2] for row in rows], dtype=np.int64)
+        # Compact level/module numbering for bincount
+        levels, self.level_index = np.unique(self.level_ids, return_inverse=True)
+        modules, self.module_index = np.unique(self.module_ids, return_inverse=True)
+        self.level_count, self.module_count = len(levels), len(modules)
+        self.row = np.zeros(size, dtype=np.float32)
+        self.column = np.zeros(size, dtype=np.float32)
+        self.type_code = np.zeros(size, dtype=np.int8)
+        self.volume = np.zeros(size, dtype=np.float32)
+        self.dims_sorted = np.zeros((size, 3), dtype=np.float32)
+        self.item_count = np.zeros(size, dtype=np.int32)
+        self.sized = np.zeros(0, dtype=np.int64)
+        if size:
+            self._set_location_columns(np.arange(size), rows)
+        self.categories = {}
+        self.size = size
+        self._add_categories(_category_rows())
+
+        self._proximity_cache.clear()
+        self._rebuild = False
+        self._dirty_locations.clear()
+        self._dirty_items.clear()
+        self.built_at = time.monotonic()
+
+    def _refresh(self):
+        location_ids = set(self._dirty_locations)
+        if self._dirty_items:
+            location_ids.update(db.session.execute(
+                select(ItemLocation.location_id).where(ItemLocation.item_id.in_(self._dirty_items))
+            ).scalars())
+        self._dirty_locations.clear()
+        self._dirty_items.clear()
+        location_ids.discard(None)
+        if not location_ids:
+            return
+
+        rows = _location_rows(location_ids)
+        positions = self._positions([row[0] for row in rows])
+        if len(rows) != len(location_ids) or (positions < 0).any():
+            self._build()  # a location was added or removed
+            return
+        self._set_location_columns(positions, rows)
+        self._proximity_cache.clear()
+        stale = set(positions.tolist())
+        for bins in self.categories.values():
+            for position in stale & bins.keys():
+                del bins[position]
+        self._add_categories(_category_rows(location_ids))
+
+    def _positions(self, location_ids):
+        """Array positions of location ids, -1 where unknown"""
+        ids = np.asarray(location_ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        positions[positions >= self.size] = 0
+        found = self.size > 0 and self.ids[positions] == ids
+        return np.where(found, positions, -1)
+
+    # Scoring
+
+    def _proximity(self, category):
+        key = _category_key(category)
+        cached = self._proximity_cache.get(key)
+        if cached is None:
+            if len(self._proximity_cache) >= PROXIMITY_CACHE_SIZE:
+                self._proximity_cache.clear()
+            cached = self._proximity_cache[key] = self._compute_proximity(self.categories.get(key))
+        return cached
+
+    def _compute_proximity(self, bins):
+        if not bins:
+            return np.zeros(self.size, dtype=np.float32)
+        held = np.fromiter(bins.keys(), dtype=np.int64, count=len(bins))
+        # Centre of the category's bins on each level that has any
+        levels = self.level_index[held]
+        per_level = np.bincount(levels, minlength=self.level_count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            row_centre = (np.bincount(levels, weights=self.row[held], minlength=self.level_count)
+                          / per_level).astype(np.float32)
+            column_centre = (np.bincount(levels, weights=self.column[held], minlength=self.level_count)
+                             / per_level).astype(np.float32)
+        per_module = np.bincount(self.module_index[held], minlength=self.module_count)
+
+        distance = np.hypot(self.row - row_centre[self.level_index],
+                            self.column - column_centre[self.level_index])
+        same_level = 0.5 + 0.5 / (1 + distance)
+        same_module = np.where(per_module[self.module_index] > 0, np.float32(0.3), np.float32(0))
+        return np.where(per_level[self.level_index] > 0, same_level, same_module)
+
+    def _fit(self, dimensions):
+        fit = np.full(self.size, 0.5, dtype=np.float32)
+        fits = np.ones(self.size, dtype=bool)
+        if not dimensions:
+            return fit, fits
+        wanted = np.zeros(3, dtype=np.float32)
+        wanted[:len(dimensions)] = sorted(dimensions, reverse=True)[:3]
+        fits[self.sized] = (wanted <= self.dims_sorted[self.sized]).all(axis=1)
+        if len(dimensions) == 3:
+            usage = np.prod(wanted) / self.volume[self.sized]
+            fit[self.sized] = np.where(np.isnan(usage), 0.5, 0.5 + 0.5 * np.clip(usage, 0, 1))
+        return fit, fits
+
+    def score(self, item_type=None, category=None, dimensions=None, module_id=None, level_id=None,
+              empty_only=False, exclude_ids=(), limit=DEFAULT_LIMIT):
+        """(location id, score, component scores) of the best candidates, and the candidate count"""
+        with self._lock:
+            self._ensure_current()
+            if not self.size:
+                return [], 0
+
+            scores = {
+                'type': _COMPATIBILITY[_code(item_type, ITEM_TYPES)][self.type_code],
+                'proximity': self._proximity(category),
+                'empty': (self.item_count == 0).astype(np.float32),
+            }
+            scores['fit'], allowed = self._fit(dimensions)
+            total = sum(WEIGHTS[name] * values for name, values in scores.items())
+
+            allowed &= scores['type'] > 0
+            if module_id:
+                allowed &= self.module_ids == module_id
+            if level_id:
+                allowed &= self.level_ids == level_id
+            if empty_only:
+                allowed &= self.item_count == 0
+            if len(exclude_ids):
+                excluded = self._positions(list(exclude_ids))
+                allowed[excluded[excluded >= 0]] = False
+
+            total = np.where(allowed, total, -np.inf)
+            candidates = int(allowed.sum())
+            limit = min(limit, candidates)
+            if not limit:
+                return [], 0
+            best = np.argpartition(-total, limit - 1)[:limit]
+            # Ties broken by id so results are stable
+            best = best[np.lexsort((self.ids[best], -total[best]))]
+            return [
+                (int(self.ids[p]), round(float(total[p]), 4),
+                 {name: round(float(values[p]), 3) for name, values in scores.items()})
+                for p in best
+            ], candidates
+
+
+index = LocationIndex()
+
+
+def suggest(item_type=None, category=None, dimensions=None, module_id=None, level_id=None,
+            empty_only=False, exclude_ids=(), limit=DEFAULT_LIMIT):
+    """
+    Ranked storage locations for an item described by type, category and size.
+
+    Returns a list of dicts with the location's id, address, type, item
+    count, total score and the per-component scores, plus the number of
+    locations that were eligible.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    ranked, candidates = index.score(item_type, category, dimensions, module_id, level_id,
+                                     empty_only, exclude_ids, limit)
+    details = {
+        row.id: row for row in db.session.execute(
+            select(Location.id, Location.address, Location.location_type, Location.item_count)
+            .where(Location.id.in_([location_id for location_id, _, _ in ranked]))
+        )
+    } if ranked else {}
+    return [
+        {
+            'location_id': location_id,
+            'address': details[location_id].address,
+            'location_type': details[location_id].location_type,
+            'item_count': details[location_id].item_count,
+            'score': score,
+            'scores': scores,
+        }
+        for location_id, score, scores in ranked if location_id in details
+    ], candidates
+
+
+def suggest_for_item(item, limit=DEFAULT_LIMIT, **filters):
+    """Suggestions for an existing item, skipping the bins it is already in"""
+    exclude = [il.location_id for il in item.item_locations]
+    return suggest(item.item_type, item.category, item_dimensions(item.item_metadata),
+                   exclude_ids=exclude, limit=limit, **filters)
+
+
+# Write tracking
+
+def _track_writes(session, changes):
+    for obj in write_tracking.written(session):
+        if isinstance(obj, Level):
+            # Grids are created and resized with bulk statements
+            changes['rebuild'] = True
+        elif isinstance(obj, Location):
+            if obj in session.new or obj in session.deleted:
+                changes['rebuild'] = True
+            else:
+                changes.setdefault('locations', set()).add(obj.id)
+        elif isinstance(obj, ItemLocation):
+            history = attributes.get_history(obj, 'location_id')
+            locations = changes.setdefault('locations', set())
+            locations.update(history.added or ())
+            locations.update(history.deleted or ())
+            locations.add(obj.__dict__.get('location_id'))
+        elif isinstance(obj, Item) and obj not in session.new:
+            changes.setdefault('items', set()).add(obj.id)
+
+
+def _apply(changes):
+    if changes.get('rebuild'):
+        index.invalidate()
+    else:
+        index.mark_dirty(changes.get('locations', ()), changes.get('items', ()))
+
+
+write_tracking.register('location_suggestion', _track_writes, _apply)
@@ -0,0 +1,154 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with ``WHERE (k1, k2, ...) > (:v1, :v2, ...)`` on the sort
+keys of the last row seen, so every page costs the same no matter how deep
+into the result set it is. Cursors are opaque URL-safe tokens carrying the
+direction and the key values of the boundary row.
+"""
+
+import base64
+import json
+from flask import request, url_for
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql import operators
+from werkzeug.exceptions import BadRequest
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 1000
+
+
+class InvalidCursor(BadRequest):
+    description = 'Invalid pagination cursor'
+
+
+class Page:
+    """One page of results plus the cursors for its neighbours"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, list(values)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor()
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor()
+    return direction, values
+
+
+def _split_key(key):
+    """Return (expression, descending) for a sort key such as Item.name or Item.name.desc()"""
+    if isinstance(key, UnaryExpression) and key.modifier in (operators.desc_op, operators.asc_op):
+        return key.element, key.modifier is operators.desc_op
+    return key, False
+
+
+def _after(keys, values, backwards):
+    """Filter selecting rows strictly past values in the (possibly reversed) sort order"""
+    descending = {desc != backwards for _, desc in keys}
+    if len(descending) == 1:
+        exprs = tuple_(*[expr for expr, _ in keys])
+        bound = tuple_(*values)
+        return exprs < bound if descending.pop() else exprs > bound
+
+    # Mixed directions cannot use a row comparison; expand it instead.
+    clauses = []
+    for i, (expr, desc) in enumerate(keys):
+        past = expr < values[i] if desc != backwards else expr > values[i]
+        clauses.append(and_(*[keys[j][0] == values[j] for j in range(i)], past))
+    return or_(*clauses)
+
+
+def keyset(query, keys, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """
+    Limit query (an ORM Query or a select()) to one page ordered by keys.
+
+    Returns the statement, with the key values added as trailing columns,
+    and the window that page_from_rows() needs to turn its rows into a Page.
+    ``keys`` must identify rows uniquely, so end it with the primary key.
+    Any existing ORDER BY on the query is replaced.
+    """
+    keys = [_split_key(k) for k in keys]
+    per_page = max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+
+    direction, values = decode_cursor(cursor) if cursor else ('next', None)
+    if values is not None and len(values) != len(keys):
+        raise InvalidCursor()
+    backwards = direction == 'prev'
+
+    query = query.order_by(None).add_columns(*[expr for expr, _ in keys])
+    if values is not None:
+        query = query.filter(_after(keys, values, backwards))
+    query = query.order_by(*[
+        expr.desc() if desc != backwards else expr.asc() for expr, desc in keys
+    ])
+    return query.limit(per_page + 1), (per_page, values, backwards)
+
+
+def page_from_rows(rows, window):
+    """Page of the rows fetched with a keyset() statement"""
+    per_page, values, backwards = window
+    has_more = len(rows) > per_page
+    rows = list(rows[:per_page])
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    first_key = list(rows[0][1:]) if rows else None
+    last_key = list(rows[-1][1:]) if rows else None
+
+    next_cursor = prev_cursor = None
+    if rows and (has_more if not backwards else values is not None):
+        next_cursor = encode_cursor('next', last_key)
+    if rows and (has_more if backwards else values is not None):
+        prev_cursor = encode_cursor('prev', first_key)
+    return Page(items, next_cursor, prev_cursor)
+
+
+def paginate(query, keys, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """Fetch one page of query ordered by keys (see keyset())"""
+    query, window = keyset(query, keys, cursor, per_page)
+    return page_from_rows(query.all(), window)
+
+
+def page_url(cursor):
+    """URL of the current endpoint with its arguments and the given cursor"""
+    args = request.args.to_dict()
+    args['cursor'] = cursor
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def link_header(page, url=page_url):
+    """RFC 8288 Link header value pointing at the neighbouring pages"""
+    links = []
+    if page.has_next:
+        links.append(f'<{url(page.next_cursor)}>; rel="next"')
+    if page.has_prev:
+        links.append(f'<{url(page.prev_cursor)}>; rel="prev"')
+    return ', '.join(links)
@@ -0,0 +1,148 @@
+"""
+Database connection pool configuration and instrumentation.
+
+Pool sizing and timeouts come from the environment:
+
+- ``DB_POOL_SIZE``: connections kept open per worker process (default 5)
+- ``DB_MAX_OVERFLOW``: extra connections allowed under load (default 10)
+- ``DB_POOL_TIMEOUT``: seconds to wait for a free connection (default 10)
+- ``DB_POOL_RECYCLE``: reopen connections older than this many seconds (default 1800)
+- ``DB_POOL_PRE_PING``: test connections on checkout (default on)
+- ``DB_STATEMENT_TIMEOUT``: PostgreSQL ``statement_timeout`` in ms for
+  every statement a request runs (default 30000, 0 disables)
+
+Every worker process has its own pool, so the database sees up to
+``workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW)`` connections. The pool keeps
+a histogram of how long checkouts waited, which is the number to watch
+when sizing it against the worker and thread counts.
+"""
+
+import os
+import threading
+import time
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from app.models import db
+
+# Upper bounds in seconds; the last bucket catches everything slower
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _flag(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of durations in seconds"""
+
+    def __init__(self, buckets=WAIT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def to_dict(self):
+        """Cumulative bucket counts keyed by upper bound, Prometheus style"""
+        with self._lock:
+            counts = list(self.counts)
+            count, total, slowest = self.count, self.total, self.max
+        cumulative, running = {}, 0
+        for bound, n in zip(self.buckets + ('+Inf',), counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {
+            'buckets': cumulative,
+            'count': count,
+            'sum': round(total, 6),
+            'max': round(slowest, 6),
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait times and exhaustion timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_times = Histogram()
+        self.timeouts = 0
+        self.peak_checked_out = 0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            self.wait_times.observe(time.perf_counter() - started)
+            raise
+        self.wait_times.observe(time.perf_counter() - started)
+        self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        # SQLite pools are managed by Flask-SQLAlchemy
+        return {}
+
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': _flag('DB_POOL_PRE_PING', True),
+    }
+    timeout = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))
+    if url.get_backend_name() == 'postgresql' and timeout > 0:
+        # Set once per connection, so it costs no extra round trip per request
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+
+def statement_timeout(milliseconds):
+    """Override statement_timeout for the rest of the current transaction (0 = none)"""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text(f'SET LOCAL statement_timeout = {int(milliseconds)}'))
+
+
+def pool_stats(engine=None):
+    """Current state and checkout wait histogram of this process's pool"""
+    pool = (engine or db.engine).pool
+    stats = {
+        'pid': os.getpid(),
+        'pool_class': type(pool).__name__,
+        'status': pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            'peak_checked_out': pool.peak_checked_out,
+            'timeouts': pool.timeouts,
+            'wait_seconds': pool.wait_times.to_dict(),
+        })
+    return stats
@@ -0,0 +1,320 @@
+"""
+Write-invalidated response cache for the hierarchy and facet JSON APIs
+(and, through ``memoize``, for values such as level grid occupancy).
+
+Cached responses are keyed on endpoint, view arguments and query string,
+and carry a strong ETag so browsers revalidate with If-None-Match and get
+304s. Each entry also depends on a few tags; a tag is a version number
+that is bumped when a committed flush touches the rows behind it, which
+makes every entry built on the old version unreachable:
+
+- ``hierarchy``: any Module or Level write (rare; everything depends on it)
+- ``modules``: locations added or removed (module counters)
+- ``levels:<module_id>``: location or placement writes in that module
+- ``locations`` and ``locations:<level_id>``: location or placement writes
+- ``items``: item writes (metadata facets)
+
+The backend is pluggable. ``MemoryBackend`` is per process; with several
+workers set ``RESPONSE_CACHE_DIR`` (e.g. a directory in /dev/shm) to share
+entries and tag versions between them through ``FileBackend``. Entries
+also expire after ``RESPONSE_CACHE_TTL`` seconds (default 300).
+"""
+
+import fcntl
+import functools
+import hashlib
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, request
+from sqlalchemy import select
+from app.models import Module, Level, Location, Item, ItemLocation
+from app.services import write_tracking
+
+DEFAULT_TTL = 300
+
+
+class MemoryBackend:
+    """
+    Thread-safe in-process LRU store. Tag versions are kept apart from the
+    LRU and never evicted, so an entry built on an old version cannot become
+    reachable again.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.time() + ttl if ttl else None, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._data.clear()
+
+
+class FileBackend:
+    """
+    Store shared by the worker processes of a host, one file per key.
+
+    Entry files start with their expiry time, so a periodic prune can drop
+    expired (and, through expiry, superseded) entries without unpickling
+    them, and trims the oldest ones beyond max_entries. Counters live in a
+    versions/ subdirectory that pruning leaves alone.
+    """
+
+    PRUNE_INTERVAL = 60
+    _EXPIRES = struct.Struct('<d')
+
+    def __init__(self, directory, max_entries=10000):
+        self.directory = directory
+        self.versions = os.path.join(directory, 'versions')
+        self.max_entries = max_entries
+        self._next_prune = 0
+        os.makedirs(self.versions, exist_ok=True)
+
+    def _path(self, key, directory=None):
+        return os.path.join(directory or self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _read(self, path):
+        """(expires, value) stored at path, or None"""
+        try:
+            with open(path, 'rb') as f:
+                expires, = self._EXPIRES.unpack(f.read(self._EXPIRES.size))
+                return expires, pickle.load(f)
+        except (OSError, EOFError, struct.error, pickle.UnpicklingError):
+            return None
+
+    def _write(self, path, expires, value):
+        # Write then rename, so readers never see a partial file
+        handle, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self._EXPIRES.pack(expires))
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+
+    def get(self, key):
+        entry = self._read(self._path(key))
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires and expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._write(self._path(key), time.time() + ttl if ttl else 0, value)
+        if time.time() >= self._next_prune:
+            self.prune()
+
+    def counter(self, key):
+        entry = self._read(self._path(key, self.versions))
+        return entry[1] if entry else 0
+
+    def incr(self, key):
+        path = self._path(key, self.versions)
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self.counter(key) + 1
+            self._write(path, 0, value)
+            return value
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file(follow_symlinks=False):
+                yield entry
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def prune(self):
+        """Remove expired entries and abandoned temp files, then the oldest beyond max_entries"""
+        now = time.time()
+        self._next_prune = now + self.PRUNE_INTERVAL
+        kept = []
+        for entry in self._entries():
+            try:
+                modified = entry.stat().st_mtime
+                if entry.name.startswith('.tmp'):
+                    if modified < now - self.PRUNE_INTERVAL:
+                        self._remove(entry.path)
+                    continue
+                with open(entry.path, 'rb') as f:
+                    expires, = self._EXPIRES.unpack(f.read(self._EXPIRES.size))
+            except (OSError, struct.error):
+                self._remove(entry.path)
+                continue
+            if expires and expires < now:
+                self._remove(entry.path)
+            else:
+                kept.append((modified, entry.path))
+
+        if len(kept) > self.max_entries:
+            kept.sort()
+            for _, path in kept[:len(kept) - self.max_entries]:
+                self._remove(path)
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        for entry in self._entries():
+            self._remove(entry.path)
+
+
+class ResponseCache:
+    """Tag-versioned response store on top of a backend"""
+
+    def __init__(self, backend=None, ttl=DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+
+    def _versions(self, tags):
+        return tuple(self.backend.counter(f'tag:{tag}') for tag in tags)
+
+    def key(self, tags):
+        arguments = sorted(request.args.items(multi=True))
+        view_args = sorted((request.view_args or {}).items())
+        return f'response:{request.endpoint}:{view_args}:{arguments}:{self._versions(tags)}'
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, entry):
+        self.backend.set(key, entry, self.ttl)
+
+    def memoize(self, name, tags, build):
+        """build()'s value, cached under name until one of tags is invalidated"""
+        key = f'value:{name}:{self._versions(tags)}'
+        value = self.backend.get(key)
+        if value is None:
+            value = build()
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.incr(f'tag:{tag}')
+
+    def invalidate_all(self):
+        self.invalidate('hierarchy')
+
+
+cache = ResponseCache()
+
+
+def configure(app):
+    """Pick the backend and TTL from RESPONSE_CACHE_DIR / RESPONSE_CACHE_TTL"""
+    directory = app.config.get('RESPONSE_CACHE_DIR')
+    cache.backend = FileBackend(directory) if directory else MemoryBackend()
+    cache.ttl = int(app.config.get('RESPONSE_CACHE_TTL', DEFAULT_TTL))
+
+
+def cached_json(tags):
+    """
+    Cache a JSON view's 200 responses under tags(**view_args) + 'hierarchy'
+    and answer If-None-Match with 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**view_args):
+            key = cache.key(['hierarchy', *tags(**view_args)])
+            entry = cache.get(key)
+            if entry is None:
+                response = view(**view_args)
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (
+                    body,
+                    response.mimetype,
+                    {k: v for k, v in response.headers.items() if k == 'Link'},
+                    hashlib.sha256(body).hexdigest()[:32],
+                )
+                cache.set(key, entry)
+
+            body, mimetype, headers, etag = entry
+            response = Response(body, mimetype=mimetype, headers=headers)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'  # always revalidate
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+# Invalidation
+
+def _track_writes(session, changes):
+    tags = changes.setdefault('tags', set())
+    level_ids, location_ids = set(), set()
+
+    for obj in write_tracking.written(session):
+        if isinstance(obj, (Module, Level)):
+            tags.add('hierarchy')
+        elif isinstance(obj, Location):
+            level_id = obj.__dict__.get('level_id')
+            level_ids.add(level_id)
+            tags.update(('locations', f'locations:{level_id}'))
+            if obj in session.new or obj in session.deleted:
+                tags.add('modules')
+        elif isinstance(obj, ItemLocation):
+            location_ids.add(obj.__dict__.get('location_id'))
+        elif isinstance(obj, Item):
+            tags.add('items')
+
+    if 'hierarchy' in tags:
+        return
+    connection = session.connection()
+    if location_ids:
+        # Placements change the location's item count and its level's occupancy
+        rows = connection.execute(
+            select(Location.level_id).where(Location.id.in_(location_ids))
+        ).scalars()
+        for level_id in rows:
+            level_ids.add(level_id)
+            tags.update(('locations', f'locations:{level_id}'))
+    if level_ids:
+        module_ids = connection.execute(
+            select(Level.module_id).where(Level.id.in_(level_ids))
+        ).scalars()
+        tags.update(f'levels:{module_id}' for module_id in module_ids)
+
+
+def _invalidate(changes):
+    cache.invalidate(*changes['tags'])
+
+
+write_tracking.register('response_cache', _track_writes, _invalidate)
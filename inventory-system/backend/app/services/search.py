@@ -0,0 +1,146 @@
+"""
+Item search service shared by the search and item blueprints.
+
+On PostgreSQL queries are matched against the weighted ``items.search_vector``
+column (GIN indexed), ranked with ``ts_rank`` and highlighted with
+``ts_headline``. Other databases fall back to ILIKE matching ordered by name
+(tags are matched whole, through the item_tags table).
+"""
+
+import re
+from markupsafe import Markup, escape
+from sqlalchemy import Float, Numeric, cast, func, literal, literal_column, false, select
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR
+from app.models import db, Item, ItemTag, normalize_tags
+
+# Control characters used as highlight markers so that the snippet can be
+# HTML-escaped before the <mark> tags are put in.
+_START_SEL = '\x02'
+_STOP_SEL = '\x03'
+_HEADLINE_OPTIONS = (
+    f'StartSel={_START_SEL}, StopSel={_STOP_SEL}, '
+    'MaxWords=25, MinWords=10, MaxFragments=2, FragmentDelimiter=" … "'
+)
+
+search_vector = literal_column('items.search_vector', type_=TSVECTOR)
+
+# Decimals kept of ts_rank() in results and keyset cursors (see _rank)
+RANK_DIGITS = 6
+
+# Typed, since asyncpg binds plain strings as VARCHAR, which to_tsquery() rejects
+_CONFIG = literal('english', REGCONFIG)
+
+
+def use_fulltext():
+    """Whether the bound database supports the tsvector search column"""
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _tsquery(text):
+    """Build a prefix tsquery from free text, e.g. 'LM31 reg' -> 'LM31:* & reg:*'"""
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return None
+    return func.to_tsquery(_CONFIG, ' & '.join(f'{t}:*' for t in terms))
+
+
+def _rank(tsquery):
+    """
+    ts_rank() rounded to RANK_DIGITS decimals, as a float8.
+
+    ts_rank() itself is a float4, which psycopg2 reads back rounded to its
+    shortest text form and asyncpg decodes exactly, and which a pagination
+    cursor cannot hold exactly. The rounded float8 is the same value through
+    either driver and survives the round trip through a cursor.
+    """
+    return cast(func.round(cast(func.ts_rank(search_vector, tsquery), Numeric), RANK_DIGITS), Float)
+
+
+def rank_expression(text):
+    """The relevance of a match for text, or None without full-text search"""
+    if not use_fulltext():
+        return None
+    tsquery = _tsquery(text)
+    if tsquery is None:
+        return None
+    return _rank(tsquery)
+
+
+def apply_search(query, text, fulltext=None):
+    """Filter an Item query to matches for text, ordered by relevance"""
+    if fulltext is None:
+        fulltext = use_fulltext()
+    if fulltext:
+        tsquery = _tsquery(text)
+        if tsquery is None:
+            return query.filter(false())
+        return query.filter(search_vector.op('@@')(tsquery)).order_by(
+            func.ts_rank(search_vector, tsquery).desc()
+        )
+
+    search_term = f"%{text}%"
+    return query.filter(
+        db.or_(
+            Item.name.ilike(search_term),
+            Item.description.ilike(search_term),
+            Item.id.in_(select(ItemTag.item_id).where(ItemTag.tag.in_(normalize_tags([text])))),
+            Item.notes.ilike(search_term)
+        )
+    )
+
+
+def _render_headline(headline):
+    if headline is None:
+        return None
+    return Markup(
+        str(escape(headline)).replace(_START_SEL, '<mark>').replace(_STOP_SEL, '</mark>')
+    )
+
+
+def search_statement(text, query=None, limit=None, fulltext=None):
+    """
+    The search query (an ORM Query or a select() of Item) for text, with
+    the rank and headline columns added under full-text search; None when
+    text has no searchable terms. Rows go through search_results().
+    """
+    if fulltext is None:
+        fulltext = use_fulltext()
+    query = apply_search(query if query is not None else Item.query, text, fulltext)
+
+    if fulltext:
+        tsquery = _tsquery(text)
+        if tsquery is None:
+            return None
+        query = query.add_columns(
+            _rank(tsquery),
+            func.ts_headline(_CONFIG, Item.description, tsquery, _HEADLINE_OPTIONS),
+        )
+
+    query = query.order_by(Item.name)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+def search_results(rows, fulltext):
+    """(item, rank, snippet) tuples of the rows of a search_statement()"""
+    if not fulltext:
+        return [(row[0], None, None) for row in rows]
+    return [(item, rank, _render_headline(headline)) for item, rank, headline in rows]
+
+
+def search_items(text, query=None, limit=None):
+    """
+    Run a ranked search and return a list of (item, rank, snippet) tuples.
+
+    ``snippet`` is HTML-safe markup of the description with the matched
+    terms wrapped in <mark>, or None when full-text search is unavailable.
+    """
+    fulltext = use_fulltext()
+    query = search_statement(text, query, limit, fulltext)
+    if query is None:
+        return []
+    rows = query.all()
+    if not fulltext:
+        return [(item, None, None) for item in rows]
+    return search_results(rows, fulltext)
@@ -0,0 +1,390 @@
+"""
+"Similar items" from precomputed nearest neighbors.
+
+Every item is a sparse TF-IDF vector over the terms of its name, tags,
+category and description: sublinear term frequency, name and tags weighted
+up, rows L2-normalized so a dot product is a cosine similarity. Sizes are
+split as well, so "m3x10" also matches "m3". Terms found in more than MAX_DF
+of the items say little about an item and are dropped, which also keeps the
+sparse products small.
+
+`rebuild` scores every distinct document against all others, a chunk of
+rows at a time, and stores each item's top NEIGHBORS in item_neighbors, one
+per distinct name (copies of the item itself are the duplicate detector's
+job). The item page reads them back with one indexed query.
+
+Items created, edited or deleted through the app are re-scored right after
+commit by `refresh_pending`, against an in-process copy of the vectors: the
+item gets a fresh list and is slotted into the lists of the items it is now
+closest to. That copy is built once at startup (`build`, which the gunicorn
+master runs before forking) and never inside a request: when it is missing
+or due for a refit (every REBUILD_TTL seconds, or after MERGE_AT new
+documents), a background thread builds fresh vectors and swaps them in,
+and changes made before the first build wait for it. Bulk imports get
+their lists from the next `flask similar-items` run.
+"""
+
+import math
+import re
+import threading
+import time
+import numpy as np
+import scipy.sparse as sp
+from flask import current_app
+from sqlalchemy import delete, insert, inspect, or_, select
+from app.models import db, Item, ItemNeighbor
+from app.services import write_tracking
+from app.services.tokens import tokens
+
+NEIGHBORS = 10
+MIN_SCORE = 0.1
+MAX_DF = 0.1
+MAX_DF_FLOOR = 50  # small catalogs keep all their terms
+FIELD_WEIGHTS = (('name', 3), ('tags', 2), ('description', 1))
+CATEGORY_WEIGHT = 2
+TEXT_FIELDS = ('name', 'description', 'tags', 'category')
+REBUILD_TTL = 1800
+MERGE_AT = 500  # documents added since the last build before the vectors are rebuilt
+REVERSE_LIMIT = 200  # other items' lists updated per changed item
+CHUNK = 256  # rows per sparse product in a rebuild
+INSERT_BATCH = 5000
+
+_SIZE = re.compile(r'^([a-z]*\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)')
+
+
+def terms(name, description, tags, category):
+    """Weighted term counts of an item's text"""
+    fields = {'name': name, 'description': description, 'tags': tags}
+    counts = {}
+    for field, weight in FIELD_WEIGHTS:
+        for token in tokens(fields[field]):
+            size = _SIZE.match(token)
+            for term in (token, *size.groups()) if size else (token,):
+                if len(term) > 1:
+                    counts[term] = counts.get(term, 0) + weight
+    if category:
+        term = 'category:' + category.strip().lower()
+        counts[term] = counts.get(term, 0) + CATEGORY_WEIGHT
+    return counts
+
+
+def name_key(name):
+    return ' '.join(tokens(name))
+
+
+def _text_rows(condition=None):
+    query = select(Item.id, Item.name, Item.description, Item.tags, Item.category).order_by(Item.id)
+    if condition is not None:
+        query = query.where(condition)
+    return [(row.id, tuple(row[1:])) for row in db.session.connection().execute(query)]
+
+
+class SimilarityIndex:
+    """TF-IDF vectors of the distinct item documents, with the items sharing each"""
+
+    def __init__(self, ttl=REBUILD_TTL):
+        self.ttl = ttl
+        self.built_at = None
+        self.max_id = 0
+        self._lock = threading.Lock()
+        self._rebuild = True
+        self._building = False
+        self._pending = {}  # item id -> (name, description, tags, category), None when deleted
+
+    # Change tracking
+
+    def invalidate(self):
+        with self._lock:
+            self._rebuild = True
+
+    def record(self, changes):
+        with self._lock:
+            self._pending.update(changes)
+
+    def _stale(self):
+        expired = self.built_at is None or time.monotonic() - self.built_at > self.ttl
+        return self._rebuild or expired or len(self.added) > MERGE_AT
+
+    def _catch_up(self):
+        # Items other workers inserted; their lists were written there
+        for item_id, text in _text_rows(Item.id > self.max_id):
+            self._assign(item_id, text)
+
+    # Vectors
+
+    def build(self):
+        """Fit the vectors now, e.g. at startup, so requests never have to"""
+        with self._lock:
+            self._build()
+
+    def _refit_in_background(self):
+        if self._building:
+            return
+        self._building = True
+        app = current_app._get_current_object()
+        threading.Thread(target=self._refit, args=(app,), name='similar-items-refit', daemon=True).start()
+
+    def _refit(self, app):
+        with app.app_context():
+            try:
+                fresh = SimilarityIndex(self.ttl)
+                fresh._build()
+                with self._lock:
+                    self.__dict__.update({k: v for k, v in vars(fresh).items()
+                                          if k not in ('ttl', '_lock', '_building', '_pending')})
+                # Changes that arrived before the first build
+                refresh_pending()
+            except Exception:
+                app.logger.exception('Refitting the similar-items vectors failed')
+            finally:
+                self._building = False
+                db.session.remove()
+
+    def _build(self):
+        rows = _text_rows()
+        documents, keys = [], {}
+        self.item_doc, self.members = {}, []
+        for item_id, text in rows:
+            counts = terms(*text)
+            key = (name_key(text[0]), frozenset(counts.items()))
+            doc = keys.get(key)
+            if doc is None:
+                doc = keys[key] = len(documents)
+                documents.append((key[0], counts))
+                self.members.append([])
+            self.members[doc].append(item_id)
+            self.item_doc[item_id] = doc
+
+        # Document frequency counts items, not distinct documents
+        frequency = {}
+        for (_, counts), members in zip(documents, self.members):
+            for term in counts:
+                frequency[term] = frequency.get(term, 0) + len(members)
+        limit = max(MAX_DF * len(rows), MAX_DF_FLOOR)
+        kept = sorted(term for term, df in frequency.items() if df <= limit)
+        self.vocabulary = {term: column for column, term in enumerate(kept)}
+        self.idf = np.array([math.log((1 + len(rows)) / (1 + frequency[term])) + 1 for term in kept],
+                            dtype=np.float32)
+
+        self.keys = keys
+        self.names = {}
+        self.doc_names = np.array([self._name_id(name) for name, _ in documents], dtype=np.int32)
+        self.vectors = self._vectorize([counts for _, counts in documents])
+        self.columns = self.vectors.tocsc()  # per-term postings for single lookups
+        self.alive = np.ones(len(documents), dtype=bool)
+        self.added = []  # vectors of documents first seen after the build
+        self.max_id = rows[-1][0] if rows else 0
+        self._rebuild = False
+        self.built_at = time.monotonic()
+
+    def _name_id(self, name):
+        return self.names.setdefault(name, len(self.names))
+
+    def _vectorize(self, documents):
+        indptr, indices, data = [0], [], []
+        for counts in documents:
+            for term, count in counts.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    indices.append(column)
+                    data.append(1 + math.log(count))
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr)),
+            shape=(len(documents), len(self.vocabulary)),
+        )
+        matrix.data *= self.idf[matrix.indices]
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        matrix.data /= np.repeat(np.maximum(norms, 1e-12), np.diff(matrix.indptr)).astype(np.float32)
+        return matrix
+
+    def _assign(self, item_id, text):
+        """Move an item to the document of its current text; returns the document row"""
+        self._unassign(item_id)
+        counts = terms(*text)
+        key = (name_key(text[0]), frozenset(counts.items()))
+        doc = self.keys.get(key)
+        if doc is None:
+            doc = self.keys[key] = len(self.members)
+            self.members.append([])
+            self.doc_names = np.append(self.doc_names, np.int32(self._name_id(key[0])))
+            self.alive = np.append(self.alive, True)
+            self.added.append(self._vectorize([counts]))
+        self.members[doc].append(item_id)
+        self.alive[doc] = True
+        self.item_doc[item_id] = doc
+        self.max_id = max(self.max_id, item_id)
+        return doc
+
+    def _unassign(self, item_id):
+        doc = self.item_doc.pop(item_id, None)
+        if doc is not None:
+            self.members[doc].remove(item_id)
+            self.alive[doc] = bool(self.members[doc])
+
+    def _vector(self, doc):
+        base = self.vectors.shape[0]
+        return self.vectors[doc] if doc < base else self.added[doc - base]
+
+    def _representative(self, doc):
+        return min(self.members[doc])
+
+    # Neighbors
+
+    def _top(self, docs, scores, name, limit=NEIGHBORS):
+        """Best documents with one per distinct name, skipping the query's own name"""
+        keep = (scores >= MIN_SCORE) & self.alive[docs] & (self.doc_names[docs] != name)
+        docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))
+        docs, scores = docs[order], scores[order]
+        _, first = np.unique(self.doc_names[docs], return_index=True)
+        first = np.sort(first)[:limit]
+        return docs[first], scores[first]
+
+    def _scores(self, vector):
+        """Cosine similarity of one document vector with every document"""
+        scores = np.zeros(len(self.members), dtype=np.float32)
+        terms_, weights = vector.indices, vector.data
+        postings = self.columns[:, terms_]
+        scores[:self.vectors.shape[0]] = postings @ weights
+        if self.added:
+            scores[self.vectors.shape[0]:] = (sp.vstack(self.added) @ vector.T).toarray().ravel()
+        return scores
+
+    def neighbor_lists(self):
+        """(neighbor documents, scores) of every document, from a fresh build"""
+        transposed = self.vectors.T.tocsr()
+        lists = []
+        for start in range(0, self.vectors.shape[0], CHUNK):
+            products = self.vectors[start:start + CHUNK] @ transposed
+            for row in range(products.shape[0]):
+                span = slice(products.indptr[row], products.indptr[row + 1])
+                lists.append(self._top(products.indices[span], products.data[span],
+                                       self.doc_names[start + row]))
+        return lists
+
+    def rebuild(self):
+        """Recompute and store the neighbors of every item; returns (items, documents)"""
+        with self._lock:
+            self._build()
+            self._pending.clear()
+            lists = self.neighbor_lists()
+            db.session.execute(delete(ItemNeighbor))
+            batch = []
+            for doc, (neighbors, scores) in enumerate(lists):
+                entries = [(self._representative(n), float(s)) for n, s in zip(neighbors.tolist(), scores)]
+                for item_id in self.members[doc]:
+                    batch.extend(_rows(item_id, entries))
+                if len(batch) >= INSERT_BATCH:
+                    _insert(batch)
+                    batch = []
+            if batch:
+                _insert(batch)
+            return len(self.item_doc), len(lists)
+
+    def refresh_pending(self):
+        """Store fresh neighbors for the items changed through this process"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            if self._stale():
+                self._refit_in_background()
+                if self.built_at is None:
+                    return 0
+            changes, self._pending = self._pending, {}
+            self._catch_up()
+            for item_id, text in changes.items():
+                if text is None:
+                    self._unassign(item_id)
+                    db.session.execute(delete(ItemNeighbor).where(
+                        or_(ItemNeighbor.item_id == item_id, ItemNeighbor.neighbor_id == item_id)))
+                else:
+                    self._refresh_item(item_id, self._assign(item_id, text))
+            return len(changes)
+
+    def _refresh_item(self, item_id, doc):
+        scores = self._scores(self._vector(doc))
+        name = self.doc_names[doc]
+        neighbors, top_scores = self._top(np.arange(len(scores)), scores, name)
+        db.session.execute(delete(ItemNeighbor).where(
+            or_(ItemNeighbor.item_id == item_id, ItemNeighbor.neighbor_id == item_id)))
+        entries = [(self._representative(n), float(s)) for n, s in zip(neighbors.tolist(), top_scores)]
+        if entries:
+            _insert(_rows(item_id, entries))
+
+        # The item may now belong in the lists of the items closest to it
+        targets = [t for n in neighbors.tolist() for t in self.members[n]][:REVERSE_LIMIT]
+        if not targets:
+            return
+        current = {}
+        for row in db.session.connection().execute(
+            select(ItemNeighbor.item_id, ItemNeighbor.neighbor_id, ItemNeighbor.score)
+            .where(ItemNeighbor.item_id.in_(targets)).order_by(ItemNeighbor.item_id, ItemNeighbor.rank)
+        ):
+            current.setdefault(row.item_id, []).append((row.neighbor_id, row.score))
+        rewritten, rows = [], []
+        for target in targets:
+            score = float(scores[self.item_doc[target]])
+            entries = current.get(target, [])
+            same_name = [e for e in entries if self._doc_name(e[0]) == name]
+            if same_name and same_name[0][1] >= score:
+                continue
+            entries = [e for e in entries if self._doc_name(e[0]) != name]
+            if len(entries) >= NEIGHBORS and entries[-1][1] >= score:
+                continue
+            rewritten.append(target)
+            rows.extend(_rows(target, sorted(entries + [(item_id, score)], key=lambda e: -e[1])[:NEIGHBORS]))
+        if rewritten:
+            db.session.execute(delete(ItemNeighbor).where(ItemNeighbor.item_id.in_(rewritten)))
+            _insert(rows)
+
+    def _doc_name(self, item_id):
+        doc = self.item_doc.get(item_id)
+        return None if doc is None else self.doc_names[doc]
+
+
+def _insert(rows):
+    db.session.connection().execute(insert(ItemNeighbor.__table__), rows)
+
+
+def _rows(item_id, entries):
+    return [{'item_id': item_id, 'rank': rank, 'neighbor_id': neighbor_id, 'score': round(score, 4)}
+            for rank, (neighbor_id, score) in enumerate(entries, start=1)]
+
+
+index = SimilarityIndex()
+
+
+def refresh_pending():
+    """Re-score items changed since the last call and commit their lists"""
+    if index.refresh_pending():
+        db.session.commit()
+
+
+def related(item_id, limit=NEIGHBORS):
+    """Precomputed similar items of an item as (Item, score) pairs, most similar first"""
+    from app.services.loading import profile
+    return (
+        db.session.query(Item, ItemNeighbor.score)
+        .options(*profile('item_row'))
+        .join(ItemNeighbor, ItemNeighbor.neighbor_id == Item.id)
+        .filter(ItemNeighbor.item_id == item_id)
+        .order_by(ItemNeighbor.rank)
+        .limit(limit)
+        .all()
+    )
+
+
+# Write tracking
+
+def _track_writes(session, changes):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Item):
+            continue
+        if obj in session.deleted:
+            changes[obj.id] = None
+        elif obj in session.new or any(inspect(obj).attrs[f].history.has_changes() for f in TEXT_FIELDS):
+            changes[obj.id] = tuple(getattr(obj, f) for f in TEXT_FIELDS)
+
+
+write_tracking.register('similar_items', _track_writes, index.record)
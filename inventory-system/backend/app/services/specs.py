@@ -0,0 +1,191 @@
+"""
+Parametric filtering and facets over ``items.item_metadata``.
+
+Filters are written as ``key=value`` (``key=a|b`` for any of several
+values), ``key<n``, ``key<=n``, ``key>n``, ``key>=n`` or ``key=lo..hi`` for
+numeric ranges, ``key`` for "has this key" and ``!key`` for "does not".
+Several predicates are separated by commas and must all hold, e.g.
+``package=0805, tolerance=1%`` or ``thread=M3, length_mm<=12``.
+
+On PostgreSQL equality becomes JSONB containment (``@>``) and the rest
+JSON path tests (``@?``), which the ``jsonb_path_ops`` GIN index on the
+column serves. Other databases use the SQLite JSON functions. A value that
+looks like a number matches both the number and the string, since imported
+metadata is not always typed consistently.
+"""
+
+import json
+import re
+from sqlalchemy import and_, case, cast, func, literal, not_, or_, select, true
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+from werkzeug.exceptions import BadRequest
+from app.models import db, Item
+
+FACET_VALUES = 10  # most common values listed per key
+
+_PREDICATE = re.compile(r'^(?P<negate>!)?(?P<key>[\w.-]+)\s*(?:(?P<op><=|>=|=|<|>)\s*(?P<value>.*))?$')
+_RANGE = re.compile(r'^(?P<low>.*?)\.\.(?P<high>.*)$')
+
+
+class InvalidSpec(BadRequest):
+    description = 'Invalid spec filter'
+
+    def __init__(self, message):
+        super().__init__(f'Invalid spec filter: {message}')
+
+
+def _number(text):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _required_number(text, predicate):
+    value = _number(text.strip())
+    if value is None:
+        raise InvalidSpec(f'{predicate!r} needs a number')
+    return value
+
+
+def parse(text):
+    """
+    Predicates of a filter string as (key, op, operand) tuples.
+
+    op is 'exists', 'missing', 'in' (operand: list of values), or a
+    comparison '<', '<=', '>', '>=' (operand: number). Raises InvalidSpec.
+    """
+    predicates = []
+    for part in (text or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        match = _PREDICATE.match(part)
+        if not match or (match['negate'] and match['op']):
+            raise InvalidSpec(repr(part))
+        key, op, value = match['key'], match['op'], (match['value'] or '').strip()
+        if op is None:
+            predicates.append((key, 'missing' if match['negate'] else 'exists', None))
+        elif op == '=' and _RANGE.match(value):
+            bounds = _RANGE.match(value)
+            if bounds['low'].strip():
+                predicates.append((key, '>=', _required_number(bounds['low'], part)))
+            if bounds['high'].strip():
+                predicates.append((key, '<=', _required_number(bounds['high'], part)))
+        elif op == '=':
+            values = [v.strip() for v in value.split('|') if v.strip()]
+            if not values:
+                raise InvalidSpec(f'{part!r} needs a value')
+            predicates.append((key, 'in', values))
+        else:
+            predicates.append((key, op, _required_number(value, part)))
+    return predicates
+
+
+def parse_args(args):
+    """Predicates of every ``spec`` request argument"""
+    return [p for text in args.getlist('spec') for p in parse(text)]
+
+
+def _candidates(value):
+    number = _number(value)
+    return [value] if number is None else [number, value]
+
+
+def _path_number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _postgresql_clause(key, op, operand):
+    column = Item.item_metadata
+    path = f'$."{key}"'
+    if op == 'in':
+        return or_(*(
+            column.op('@>')(cast(literal(json.dumps({key: candidate})), JSONB))
+            for value in operand for candidate in _candidates(value)
+        ))
+    if op in ('exists', 'missing'):
+        has_key = column.op('@?')(cast(literal(path), JSONPATH))
+        return has_key if op == 'exists' else or_(column.is_(None), not_(has_key))
+    return column.op('@?')(cast(literal(f'{path} ? (@ {op} {_path_number(operand)})'), JSONPATH))
+
+
+def _sqlite_clause(key, op, operand):
+    path = f'$."{key}"'
+    value = func.json_extract(Item.item_metadata, path)
+    kind = func.json_type(Item.item_metadata, path)
+    if op == 'in':
+        return value.in_([candidate for v in operand for candidate in _candidates(v)])
+    if op == 'exists':
+        return kind.isnot(None)
+    if op == 'missing':
+        return kind.is_(None)
+    comparison = {'<': value < operand, '<=': value <= operand, '>': value > operand, '>=': value >= operand}[op]
+    return and_(kind.in_(('integer', 'real')), comparison)
+
+
+def apply(query, predicates):
+    """Filter an Item query to items whose metadata matches every predicate"""
+    if not predicates:
+        return query
+    clause = _postgresql_clause if db.engine.dialect.name == 'postgresql' else _sqlite_clause
+    return query.filter(*(clause(*predicate) for predicate in predicates))
+
+
+def facets(item_ids=None, values=FACET_VALUES):
+    """
+    Metadata keys in use with their item counts and most common values.
+
+    item_ids is an optional select() of Item ids to count within (the
+    current filters). Keys come most used first; only scalar values are
+    listed.
+    """
+    column = Item.item_metadata
+    if db.engine.dialect.name == 'postgresql':
+        # jsonb_each() raises on anything but an object
+        is_object = func.jsonb_typeof(column) == 'object'
+        objects = case((is_object, column), else_=cast(literal('{}'), JSONB))
+        entries = func.jsonb_each(objects).table_valued('key', 'value').lateral('entry')
+        kind = func.jsonb_typeof(entries.c.value)
+        scalar_kinds = ('string', 'number', 'boolean')
+    else:
+        is_object = func.json_type(column) == 'object'
+        entries = func.json_each(column).table_valued('key', 'value', 'type').alias('entry')
+        kind = entries.c.type
+        scalar_kinds = ('text', 'integer', 'real', 'true', 'false')
+
+    scope = [is_object]
+    if item_ids is not None:
+        scope.append(Item.id.in_(item_ids))
+    pairs = (
+        select(entries.c.key, entries.c.value, kind.in_(scalar_kinds).label('scalar'))
+        .select_from(Item).join(entries, true())
+        .where(*scope)
+        .subquery()
+    )
+    # One pass: per (key, value) counts, ranked within each key, with the key's total alongside
+    counts = (
+        select(pairs.c.key, pairs.c.value, pairs.c.scalar, func.count().label('item_count'))
+        .group_by(pairs.c.key, pairs.c.value, pairs.c.scalar)
+        .subquery()
+    )
+    ranked = select(
+        counts,
+        func.sum(counts.c.item_count).over(partition_by=counts.c.key).label('key_items'),
+        func.row_number().over(
+            partition_by=counts.c.key,
+            order_by=(counts.c.scalar.desc(), counts.c.item_count.desc(), counts.c.value),
+        ).label('position'),
+    ).subquery()
+    rows = db.session.connection().execute(
+        select(ranked).where(ranked.c.position <= values)
+        .order_by(ranked.c.key_items.desc(), ranked.c.key, ranked.c.position)
+    )
+
+    result = {}
+    for row in rows:
+        facet = result.setdefault(row.key, {'key': row.key, 'items': int(row.key_items), 'values': []})
+        if row.scalar:
+            facet['values'].append({'value': row.value, 'items': row.item_count})
+    return list(result.values())
@@ -0,0 +1,85 @@
+"""
+Tag filters and the tag / category / item type facet counts.
+
+Tags are matched against the normalized ``item_tags`` table rather than the
+comma-separated ``Item.tags`` string: ``m3`` matches the tag "m3" only (not
+"m30"), ``m3*`` every tag starting with "m3". Both are index lookups on
+(tag, item_id).
+"""
+
+from sqlalchemy import func, literal, select, union_all
+from app.models import db, Item, ItemTag, normalize_tags
+
+FACET_TAGS = 50  # most common tags counted per facet request
+
+
+def parse_args(args):
+    """Tag patterns of every ``tag`` request argument (comma-separated or repeated)"""
+    patterns = []
+    for text in args.getlist('tag'):
+        for pattern in text.split(','):
+            prefix = pattern.strip().endswith('*')
+            for tag in normalize_tags([pattern.strip().rstrip('*')]):
+                patterns.append(tag + '*' if prefix else tag)
+    return list(dict.fromkeys(patterns))
+
+
+def _escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def tagged(pattern):
+    """Ids of the items with tag pattern (exact, or a prefix when it ends in '*')"""
+    if pattern.endswith('*'):
+        condition = ItemTag.tag.like(_escape_like(pattern[:-1]) + '%', escape='\\')
+    else:
+        condition = ItemTag.tag == pattern
+    return select(ItemTag.item_id).where(condition)
+
+
+def apply(query, patterns):
+    """Filter an Item query to items matching every tag pattern"""
+    return query.filter(*(Item.id.in_(tagged(pattern)) for pattern in patterns))
+
+
+def facets(item_ids=None, tags=FACET_TAGS):
+    """
+    Counts per tag, category and item type in one grouped query.
+
+    item_ids is an optional select() of the Item ids in the current result
+    set. Returns {'tags': [...], 'categories': [...], 'item_types': [...]},
+    each a list of {'value', 'items'}, most common first; only the first
+    ``tags`` tags are counted.
+    """
+    result = select(Item.id)
+    if item_ids is not None:
+        result = result.where(Item.id.in_(item_ids))
+    result = result.cte('result')
+
+    tag_counts = (
+        select(literal('tags').label('facet'), ItemTag.tag.label('value'), func.count().label('item_count'))
+        .where(ItemTag.item_id.in_(select(result.c.id)))
+        .group_by(ItemTag.tag)
+        .order_by(func.count().desc(), ItemTag.tag)
+        .limit(tags)
+        .subquery()
+    )
+
+    def grouped(facet, column):
+        return (
+            select(literal(facet).label('facet'), column.label('value'), func.count().label('item_count'))
+            .where(Item.id.in_(select(result.c.id)), column.isnot(None))
+            .group_by(column)
+        )
+
+    query = union_all(
+        select(tag_counts),
+        grouped('categories', Item.category),
+        grouped('item_types', Item.item_type),
+    )
+    counts = {'tags': [], 'categories': [], 'item_types': []}
+    for row in db.session.connection().execute(query):
+        counts[row.facet].append({'value': row.value, 'items': row.item_count})
+    for values in counts.values():
+        values.sort(key=lambda v: (-v['items'], v['value']))
+    return counts
@@ -0,0 +1,15 @@
+"""
+Tokens of item text for duplicate detection and similar items.
+
+Part numbers and values stay whole ("lm317", "m3x10", "4.7k", "10%"), and
+other runs of letters are words; everything else separates tokens.
+"""
+
+import re
+
+TOKEN = re.compile(r'[a-z]*\d[\w.%/]*|[a-z]+')
+
+
+def tokens(text):
+    """Lowercased tokens of text (None gives none)"""
+    return TOKEN.findall((text or '').lower())
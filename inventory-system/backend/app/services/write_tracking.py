@@ -0,0 +1,63 @@
+"""
+Committed-write hooks for the in-process caches and indexes.
+
+The response cache, dashboard statistics, autocomplete, location
+suggestions, duplicate detection and similar items all follow the database
+the same way: note what each flush wrote, act on it once the transaction
+commits, and forget it on rollback. Each registers a tracker here instead
+of its own set of session listeners::
+
+    write_tracking.register('similar_items', _track_writes, index.record)
+
+``track(session, changes)`` runs after every flush and records what it
+needs in ``changes``, a dict kept in ``session.info`` for the transaction;
+``apply(changes)`` runs after the commit when anything was recorded.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_trackers = {}
+
+
+def register(key, track, apply):
+    """Have track() follow the flushes and apply() the changes of each commit"""
+    _trackers[key] = (track, apply)
+
+
+def clear_on_commit(key, models, clear):
+    """Call clear() after each commit that wrote an instance of models"""
+    def track(session, changes):
+        if any(isinstance(obj, models) for obj in written(session)):
+            changes['stale'] = True
+    register(key, track, lambda changes: clear())
+
+
+def written(session):
+    """Objects the flush inserted, changed or deleted"""
+    dirty = (obj for obj in session.dirty if session.is_modified(obj, include_collections=False))
+    return [*session.new, *dirty, *session.deleted]
+
+
+def _changes(session):
+    return session.info.setdefault('write_tracking', {})
+
+
+@event.listens_for(Session, 'after_flush')
+def _track(session, flush_context):
+    changes = _changes(session)
+    for key, (track, _) in _trackers.items():
+        track(session, changes.setdefault(key, {}))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply(session):
+    changes = session.info.pop('write_tracking', None)
+    for key, recorded in (changes or {}).items():
+        if recorded:
+            _trackers[key][1](recorded)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('write_tracking', None)
@@ -0,0 +1,127 @@
+"""
+Production serving with gunicorn.
+
+Workers are forked from a master that has already built the app
+(``preload_app``), so they boot fast and share its memory, including the
+similar-items vectors the master fits before forking. Every worker
+gets its own SQLAlchemy connection pool: the master drops its connections
+before forking and each worker discards any inherited pool in post_fork.
+
+Settings come from the environment:
+
+- ``BIND`` (default ``0.0.0.0:$PORT``)
+- ``WEB_CONCURRENCY``: worker processes (default 2 x cores + 1)
+- ``WEB_THREADS``: threads per worker (default 4)
+- ``WEB_TIMEOUT``: seconds before a stuck worker is killed (default 30)
+- ``WEB_GRACEFUL_TIMEOUT``: seconds workers get to finish on reload or stop (default 30)
+- ``WEB_MAX_REQUESTS``: recycle a worker after this many requests (default 2000, 0 disables)
+
+Send SIGHUP to the master for a graceful reload of the workers and
+SIGTERM for a graceful shutdown.
+
+The async read API (``app.async_api``) is served the same way with uvicorn
+workers, one event loop per core by default, configured by ``API_BIND``
+(default ``0.0.0.0:5001``) and ``API_WORKERS``.
+"""
+
+import os
+from gunicorn.app.base import BaseApplication
+from sqlalchemy.exc import SQLAlchemyError
+from app.models import db
+
+
+def cpu_count():
+    """Cores available to this process (respects CPU affinity / container limits)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers():
+    return cpu_count() * 2 + 1
+
+
+def dispose_engines(app, close=True):
+    """Drop pooled connections; close=False leaves the parent's sockets alone"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+
+
+def post_fork(server, worker):
+    # Connections inherited from the master must never be used by a worker
+    dispose_engines(worker.app.wsgi(), close=False)
+
+
+def options():
+    port = os.getenv('PORT', '5000')
+    return {
+        'bind': os.getenv('BIND', f'0.0.0.0:{port}'),
+        'workers': int(os.getenv('WEB_CONCURRENCY', default_workers())),
+        'worker_class': 'gthread',
+        'threads': int(os.getenv('WEB_THREADS', 4)),
+        'preload_app': True,
+        'timeout': int(os.getenv('WEB_TIMEOUT', 30)),
+        'graceful_timeout': int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30)),
+        'keepalive': 5,
+        'max_requests': int(os.getenv('WEB_MAX_REQUESTS', 2000)),
+        'max_requests_jitter': 200,
+        'accesslog': '-',
+        'errorlog': '-',
+        'forwarded_allow_ips': '*',  # behind nginx
+        'post_fork': post_fork,
+    }
+
+
+class ProductionServer(BaseApplication):
+    """gunicorn application serving an already created Flask app"""
+
+    def __init__(self, app, settings=None):
+        self.application = app
+        self.settings = settings or options()
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def warm_up(app):
+    """Fit the similar-items vectors in the master so no request has to"""
+    from app.services import similar_items
+    with app.app_context():
+        try:
+            similar_items.index.build()
+        except SQLAlchemyError as e:
+            # Workers fit them in the background once the schema is there
+            app.logger.warning('Similar items not built at startup: %s', e)
+        finally:
+            db.session.remove()
+
+
+def serve(app):
+    """Run app under gunicorn until the master exits"""
+    warm_up(app)
+    dispose_engines(app)
+    ProductionServer(app).run()
+
+
+def api_options():
+    # No post_fork: each worker opens its own async engine on startup
+    settings = {k: v for k, v in options().items() if k not in ('threads', 'post_fork')}
+    settings.update({
+        'bind': os.getenv('API_BIND', '0.0.0.0:5001'),
+        'workers': int(os.getenv('API_WORKERS', cpu_count())),
+        'worker_class': 'uvicorn.workers.UvicornWorker',
+    })
+    return settings
+
+
+def serve_api():
+    """Run the async read API under gunicorn until the master exits"""
+    from app.async_api import create_api
+    ProductionServer(create_api(), api_options()).run()
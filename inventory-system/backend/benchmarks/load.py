@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Concurrent end-to-end load test with latency percentiles per endpoint.
+
+Simulated users hit the app over HTTP with a workshop-like mix: 70% search
+(search page, search API, autocomplete), 20% browsing (item list, level
+grid, location picker, item pages) and 10% writes (new items, placements).
+Throughput and p50/p95/p99 latency are reported per endpoint.
+
+By default the app is started locally with ``run.py serve`` and the given
+number of workers; pass --url to load an already running server instead.
+
+    python benchmarks/load.py --workers 3 --users 12 --duration 30 --save-baseline base.json
+    python benchmarks/load.py --workers 3 --users 12 --duration 30 --baseline base.json
+
+With --baseline the run fails (exit 1) if any endpoint's p95 is more than
+--threshold (default 20%) and --min-delta-ms slower, or total throughput
+drops by more than the threshold. Without DATABASE_URL a temporary SQLite
+database with the chosen preset is used; PostgreSQL gives realistic numbers
+for the write mix.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEARCH_TERMS = ('resistor', '0805 resistor', 'capacitor 16V', 'M3 screw', 'socket head', 'nut',
+                'ESP32', 'regulator', 'paint', 'pliers', '10k', 'stainless washer')
+PREFIXES = ('re', 'res', 'cap', 'm3', 'm4x', 'esp', 'ne5', 'soc', 'pai', 'wir', 'lm', 'at')
+
+# endpoint -> share of requests
+MIX = {
+    'search_page': 20, 'search_api': 15, 'suggest': 35,
+    'items_list': 5, 'level_grid': 5, 'location_picker': 5, 'item_view': 5,
+    'create_item': 5, 'assign_location': 5,
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Target:
+    """Ids sampled from the server, used to build realistic requests"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        modules = self._json('/modules/api/modules')
+        self.levels = [level['id'] for module in modules[:20]
+                       for level in self._json(f"/modules/api/modules/{module['id']}/levels")]
+        self.locations = [location['id'] for location in self._json('/locations/api/locations?limit=1000')]
+        self.items = [item['id'] for item in self._json('/items/api/items?limit=500')]
+        if not (self.levels and self.locations and self.items):
+            raise SystemExit('The target has no data; run `flask generate-data` or use the default SQLite setup')
+
+    def _json(self, path):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        connection.request('GET', path)
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return json.loads(body)
+
+
+def build_request(name, target, rng):
+    """(method, path, form body or None) for one request of the mix"""
+    if name == 'search_page':
+        return 'GET', '/search/?' + urllib.parse.urlencode({'q': rng.choice(SEARCH_TERMS)}), None
+    if name == 'search_api':
+        return 'GET', '/search/api?' + urllib.parse.urlencode({'q': rng.choice(SEARCH_TERMS)}), None
+    if name == 'suggest':
+        return 'GET', '/search/api/suggest?' + urllib.parse.urlencode({'q': rng.choice(PREFIXES)}), None
+    if name == 'items_list':
+        return 'GET', '/items/', None
+    if name == 'level_grid':
+        return 'GET', f'/modules/levels/{rng.choice(target.levels)}', None
+    if name == 'location_picker':
+        return 'GET', f'/locations/api/locations?level_id={rng.choice(target.levels)}', None
+    if name == 'item_view':
+        return 'GET', f'/items/{rng.choice(target.items)}', None
+    if name == 'create_item':
+        return 'POST', '/items/new', {
+            'name': f'Load test part {rng.randrange(10 ** 6)}',
+            'description': f'{rng.choice(SEARCH_TERMS)} added by the load test',
+            'category': 'Electronics',
+            'location_id': rng.choice(target.locations),
+        }
+    if name == 'assign_location':
+        return 'POST', f'/items/{rng.choice(target.items)}/locations/add', {
+            'location_id': rng.choice(target.locations),
+        }
+    raise ValueError(name)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            if not ok:
+                self.errors[name] += 1
+
+
+def user(target, recorder, deadline, seed, think):
+    rng = random.Random(seed)
+    names, weights = zip(*MIX.items())
+    connection = http.client.HTTPConnection(target.host, target.port, timeout=60)
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, form = build_request(name, target, rng)
+        body = urllib.parse.urlencode(form) if form else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form else {}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(target.host, target.port, timeout=60)
+            ok = False
+        recorder.add(name, time.perf_counter() - started, ok)
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+    connection.close()
+
+
+def report(recorder, elapsed):
+    endpoints = {}
+    for name in MIX:
+        values = sorted(recorder.latencies.get(name, ()))
+        endpoints[name] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(name, 0),
+            'rps': round(len(values) / elapsed, 2),
+            'p50_ms': round(percentile(values, 0.50), 2),
+            'p95_ms': round(percentile(values, 0.95), 2),
+            'p99_ms': round(percentile(values, 0.99), 2),
+        }
+    total = sum(e['requests'] for e in endpoints.values())
+    return {
+        'duration_s': round(elapsed, 1),
+        'requests': total,
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        'rps': round(total / elapsed, 2),
+        'endpoints': endpoints,
+    }
+
+
+def regressions(current, baseline, threshold, min_delta_ms):
+    problems = []
+    for name, result in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if not before or not before['requests'] or not result['requests']:
+            continue
+        delta = result['p95_ms'] - before['p95_ms']
+        if delta > min_delta_ms and delta > threshold * before['p95_ms']:
+            problems.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+    if current['rps'] < baseline['rps'] * (1 - threshold):
+        problems.append(f"throughput {baseline['rps']} -> {current['rps']} req/s")
+    return problems
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads, env):
+    port = free_port()
+    env = dict(env, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers), WEB_THREADS=str(threads),
+               METRICS_ENABLED=env.get('METRICS_ENABLED', '1'))
+    server = subprocess.Popen([sys.executable, 'run.py', 'serve'], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit('The server exited during startup')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            connection.request('GET', '/modules/api/modules')
+            if connection.getresponse().status == 200:
+                return server, port
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('The server did not start within 60s')
+
+
+def prepare_sqlite(env, preset):
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    env['DATABASE_URL'] = f'sqlite:///{path}'
+    subprocess.run(
+        [sys.executable, '-c',
+         'from app import create_app; from app.schema import upgrade_database; '
+         'from app.services.dataset import generate, PRESETS; '
+         'app = create_app(migrations=False); upgrade_database(app); '
+         f'ctx = app.app_context(); ctx.push(); generate(*PRESETS[{preset!r}])'],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True,
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='Load an already running server, e.g. http://localhost:5000')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers of the started server')
+    parser.add_argument('--threads', type=int, default=4, help='Threads per worker')
+    parser.add_argument('--users', type=int, default=12, help='Concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load')
+    parser.add_argument('--think-ms', type=float, default=0, help='Mean pause between a user\'s requests')
+    parser.add_argument('--preset', default='small', help='Dataset for the temporary SQLite database')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    parser.add_argument('--save-baseline', help='Write the report to this file')
+    parser.add_argument('--baseline', help='Compare against a saved report')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed relative slowdown')
+    parser.add_argument('--min-delta-ms', type=float, default=5, help='Ignore p95 changes smaller than this')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    server, database = None, None
+    try:
+        if args.url:
+            parsed = urllib.parse.urlparse(args.url)
+            host, port = parsed.hostname, parsed.port or 80
+        else:
+            if not env.get('DATABASE_URL'):
+                print(f'Generating the {args.preset} dataset into a temporary SQLite database...')
+                database = prepare_sqlite(env, args.preset)
+            server, port = start_server(args.workers, args.threads, env)
+            host = '127.0.0.1'
+
+        target = Target(host, port)
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration
+        started = time.monotonic()
+        users = [
+            threading.Thread(target=user, args=(target, recorder, deadline, args.seed + i, args.think_ms / 1000))
+            for i in range(args.users)
+        ]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        result = report(recorder, time.monotonic() - started)
+        result['config'] = {'workers': None if args.url else args.workers, 'threads': args.threads,
+                            'users': args.users, 'think_ms': args.think_ms}
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        if database:
+            os.remove(database)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['requests']} requests in {result['duration_s']}s: "
+              f"{result['rps']} req/s, {result['errors']} errors")
+        print(f"{'endpoint':>16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, e in result['endpoints'].items():
+            print(f"{name:>16} {e['requests']:>9} {e['errors']:>7} {e['rps']:>8} "
+                  f"{e['p50_ms']:>8} {e['p95_ms']:>8} {e['p99_ms']:>8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(result, json.load(f), args.threshold, args.min_delta_ms)
+        if problems:
+            print('Regressions against the baseline:', file=sys.stderr)
+            for problem in problems:
+                print(f'  {problem}', file=sys.stderr)
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the hot paths, with results kept for comparison.
+
+Times search, autocomplete, the list pages, the level grid, to_dict
+serialization, dashboard statistics and grid creation against a dataset
+built by app.services.dataset. Each result is appended as one JSON line to
+benchmarks/results.jsonl with the git commit, so runs on different commits
+can be compared; --compare prints the change against the last run on the
+same dataset and database.
+
+    python benchmarks/micro.py --preset small --compare
+    DATABASE_URL=postgresql://... python benchmarks/micro.py --generate --preset medium
+
+Without DATABASE_URL a temporary SQLite database is generated for the run.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(BACKEND_DIR, 'benchmarks', 'results.jsonl')
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _timed(fn, repeat):
+    """Median and best wall time of fn in milliseconds"""
+    fn()  # warm up caches and compiled statements
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(samples), 3), 'min_ms': round(min(samples), 3)}
+
+
+def benchmarks(app):
+    """name -> zero-argument callable, each in its own app context"""
+    from app.models import db, Module, Level, Item
+    from app.services import autocomplete, dashboard
+    from app.services.grid import create_locations_for_level
+    from app.services.loading import profile
+    from app.services.search import search_items
+
+    client = app.test_client()
+    with app.app_context():
+        level_id = db.session.query(Level.id).order_by(Level.id).limit(1).scalar()
+        module_id = db.session.query(Module.id).order_by(Module.id).limit(1).scalar()
+
+    def in_context(fn):
+        def run():
+            with app.app_context():
+                fn()
+        return run
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return run
+
+    def search():
+        search_items('resistor 0805', Item.query.options(*profile('item_row')), limit=50)
+
+    def suggest():
+        autocomplete.cache.clear()
+        autocomplete.suggest('capac')
+
+    def serialize():
+        items = Item.query.options(*profile('item')).order_by(Item.id).limit(500).all()
+        [item.to_dict() for item in items]
+
+    def stats():
+        dashboard.compute_stats()
+
+    def create_grid():
+        db.session.begin_nested()
+        level = Level(module_id=module_id, level_number=10 ** 6, rows=20, columns=20)
+        db.session.add(level)
+        db.session.flush()
+        create_locations_for_level(level)
+        db.session.rollback()
+
+    return {
+        'search': in_context(search),
+        'autocomplete': in_context(suggest),
+        'items_page': get('/items/'),
+        'items_search_page': get('/items/?search=screw'),
+        'locations_page': get('/locations/'),
+        'level_grid_page': get(f'/modules/levels/{level_id}'),
+        'items_api_page': get('/items/api/items?limit=200'),
+        'to_dict_500_items': in_context(serialize),
+        'dashboard_stats': in_context(stats),
+        'grid_create_20x20': in_context(create_grid),
+    }
+
+
+def dataset_counts(app):
+    from app.models import db, Module, Level, Location, Item
+    with app.app_context():
+        return {model.__tablename__: db.session.query(model).count() for model in (Module, Level, Location, Item)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(record):
+    if not os.path.exists(RESULTS):
+        return None
+    previous = None
+    with open(RESULTS) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry['dataset'] == record['dataset'] and entry['database'] == record['database']:
+                previous = entry
+    return previous
+
+
+def main():
+    from app.services.dataset import PRESETS
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--generate', action='store_true', help='Generate the preset into DATABASE_URL first')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--only', nargs='*', help='Run only these benchmarks')
+    parser.add_argument('--compare', action='store_true', help='Show the change against the previous run')
+    parser.add_argument('--no-save', action='store_true', help='Do not append to results.jsonl')
+    args = parser.parse_args()
+
+    temporary = None
+    if not os.getenv('DATABASE_URL'):
+        handle, temporary = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        os.environ['DATABASE_URL'] = f'sqlite:///{temporary}'
+        args.generate = True
+    os.environ.setdefault('METRICS_ENABLED', '0')
+
+    from app import create_app
+    from app.schema import upgrade_database
+    from app.services.dataset import generate
+
+    app = create_app(migrations=False)
+    try:
+        if args.generate:
+            upgrade_database(app)
+            with app.app_context():
+                print('Generating', args.preset, generate(*PRESETS[args.preset]))
+
+        record = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'dataset': dataset_counts(app),
+            'results': {},
+        }
+        for name, fn in benchmarks(app).items():
+            if args.only and name not in args.only:
+                continue
+            record['results'][name] = _timed(fn, args.repeat)
+
+        previous = previous_result(record) if args.compare else None
+        for name, result in record['results'].items():
+            line = f'{name:>20}: {result["median_ms"]:9.2f} ms'
+            if previous and name in previous['results']:
+                before = previous['results'][name]['median_ms']
+                line += f'  ({(result["median_ms"] - before) / before * 100:+.1f}% vs {previous["commit"]})'
+            print(line)
+
+        if not args.no_save:
+            with open(RESULTS, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+    finally:
+        if temporary:
+            os.remove(temporary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: process start to first served request.
+
+Each run starts a fresh interpreter that imports the app, builds it the way
+run.py does and serves one request through the WSGI stack, timing each
+phase. The median of the runs is reported; with --budget-ms the script
+exits non-zero when the median total exceeds the budget, so it can gate CI.
+
+    python benchmarks/startup.py --runs 10 --budget-ms 1500
+
+Uses DATABASE_URL when set, otherwise a throwaway SQLite database.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(migrations=False)
+created = time.perf_counter()
+response = app.test_client().get(PATH)
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - started) * 1000,
+}))
+'''
+
+
+def run_once(path, env):
+    output = subprocess.run(
+        [sys.executable, '-c', f'PATH = {path!r}\n' + CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def prepare_sqlite(env):
+    """Create and migrate a temporary SQLite database for the runs"""
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    env['DATABASE_URL'] = f'sqlite:///{path}'
+    subprocess.run(
+        [sys.executable, '-c', 'from app import create_app; from app.schema import upgrade_database; '
+                               'upgrade_database(create_app(migrations=False))'],
+        cwd=BACKEND_DIR, env=env, capture_output=True, check=True,
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/modules/api/modules', help='Request to serve first')
+    parser.add_argument('--budget-ms', type=float, help='Fail if the median total exceeds this')
+    parser.add_argument('--json', action='store_true', help='Print the result as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    database = None if env.get('DATABASE_URL') else prepare_sqlite(env)
+    try:
+        runs = [run_once(args.path, env) for _ in range(args.runs)]
+    finally:
+        if database:
+            os.remove(database)
+
+    result = {phase: round(statistics.median(run[phase] for run in runs), 1) for phase in runs[0]}
+    result['runs'] = args.runs
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for phase, value in result.items():
+            print(f'{phase:>18}: {value}')
+
+    if args.budget_ms is not None and result['total_ms'] > args.budget_ms:
+        print(f"Startup took {result['total_ms']}ms, over the {args.budget_ms}ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
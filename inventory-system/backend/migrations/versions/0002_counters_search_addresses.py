@@ -0,0 +1,98 @@
+"""denormalized counters, stored addresses, search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+ITEM_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('english', coalesce(notes, '')), 'D')"
+)
+
+# models.cell_label(): numbered rows (levels over 26 rows) get a '-' before the column
+CELL_LABEL = (
+    "CASE WHEN substr(locations.row, 1, 1) BETWEEN '0' AND '9' "
+    "THEN locations.row || '-' || locations.\"column\" "
+    "ELSE locations.row || locations.\"column\" END"
+)
+
+
+def upgrade():
+    with op.batch_alter_table('modules') as batch_op:
+        batch_op.add_column(sa.Column('level_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('location_count', sa.Integer(), server_default='0', nullable=False))
+    with op.batch_alter_table('levels') as batch_op:
+        batch_op.add_column(sa.Column('location_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('occupied_count', sa.Integer(), server_default='0', nullable=False))
+    with op.batch_alter_table('locations') as batch_op:
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('address', sa.String(length=150), nullable=True))
+
+    # Backfill counters and addresses from the existing rows
+    op.execute(
+        "UPDATE locations SET item_count = "
+        "(SELECT count(*) FROM item_locations WHERE item_locations.location_id = locations.id)"
+    )
+    op.execute(
+        "UPDATE levels SET "
+        "location_count = (SELECT count(*) FROM locations WHERE locations.level_id = levels.id), "
+        "occupied_count = (SELECT count(*) FROM locations "
+        "WHERE locations.level_id = levels.id AND locations.item_count > 0)"
+    )
+    op.execute(
+        "UPDATE modules SET "
+        "level_count = (SELECT count(*) FROM levels WHERE levels.module_id = modules.id), "
+        "location_count = (SELECT coalesce(sum(levels.location_count), 0) FROM levels "
+        "WHERE levels.module_id = modules.id)"
+    )
+    op.execute(
+        "UPDATE locations SET address = "
+        "(SELECT modules.name || ':' || CAST(levels.level_number AS VARCHAR) || ':' "
+        "FROM levels JOIN modules ON modules.id = levels.module_id "
+        "WHERE levels.id = locations.level_id) || " + CELL_LABEL
+    )
+
+    with op.batch_alter_table('locations') as batch_op:
+        batch_op.alter_column('address', existing_type=sa.String(length=150), nullable=False)
+    op.create_index('ix_locations_address', 'locations', ['address'], unique=True,
+                    postgresql_ops={'address': 'varchar_pattern_ops'})
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            f"ALTER TABLE items ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({ITEM_SEARCH_VECTOR}) STORED"
+        )
+        op.execute("CREATE INDEX ix_items_search_vector ON items USING GIN (search_vector)")
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_items_name_trgm ON items USING GIN (name gin_trgm_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_items_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_items_search_vector")
+        op.execute("ALTER TABLE items DROP COLUMN IF EXISTS search_vector")
+
+    op.drop_index('ix_locations_address', table_name='locations')
+    with op.batch_alter_table('locations') as batch_op:
+        batch_op.drop_column('address')
+        batch_op.drop_column('item_count')
+    with op.batch_alter_table('levels') as batch_op:
+        batch_op.drop_column('occupied_count')
+        batch_op.drop_column('location_count')
+    with op.batch_alter_table('modules') as batch_op:
+        batch_op.drop_column('location_count')
+        batch_op.drop_column('level_count')
@@ -0,0 +1,34 @@
+"""precomputed similar items
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('item_neighbors',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('neighbor_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['neighbor_id'], ['items.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id', 'rank')
+    )
+    op.create_index('ix_item_neighbors_neighbor_id', 'item_neighbors', ['neighbor_id'])
+
+
+def downgrade():
+    op.drop_index('ix_item_neighbors_neighbor_id', table_name='item_neighbors')
+    op.drop_table('item_neighbors')
@@ -0,0 +1,28 @@
+"""item metadata as jsonb with a GIN index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 08:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite stores JSON as text either way; only PostgreSQL changes
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE items ALTER COLUMN item_metadata TYPE jsonb USING item_metadata::jsonb")
+        op.execute("CREATE INDEX ix_items_metadata ON items USING GIN (item_metadata jsonb_path_ops)")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_items_metadata")
+        op.execute("ALTER TABLE items ALTER COLUMN item_metadata TYPE json USING item_metadata::json")
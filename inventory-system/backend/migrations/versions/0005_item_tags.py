@@ -0,0 +1,44 @@
+"""normalized item tags
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    item_tags = op.create_table('item_tags',
+    sa.Column('item_id', sa.Integer(), nullable=False),
+    sa.Column('tag', sa.String(length=100), nullable=False),
+    sa.ForeignKeyConstraint(['item_id'], ['items.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('item_id', 'tag')
+    )
+
+    # Backfill from the comma-separated column, normalized like models.normalize_tags()
+    items = op.get_bind().execute(sa.text("SELECT id, tags FROM items WHERE tags IS NOT NULL AND tags <> ''")).all()
+    rows = []
+    for item_id, tags in items:
+        normalized = (' '.join(tag.lower().split())[:100] for tag in tags.split(','))
+        rows.extend({'item_id': item_id, 'tag': tag} for tag in dict.fromkeys(t for t in normalized if t))
+    for start in range(0, len(rows), BATCH_SIZE):
+        op.bulk_insert(item_tags, rows[start:start + BATCH_SIZE])
+
+    op.create_index('ix_item_tags_tag', 'item_tags', ['tag', 'item_id'],
+                    postgresql_ops={'tag': 'varchar_pattern_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_item_tags_tag', table_name='item_tags')
+    op.drop_table('item_tags')
@@ -0,0 +1,29 @@
+"""change counters (hierarchy revision)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 15:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    revisions = op.create_table('revisions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(revisions, [{'name': 'hierarchy', 'value': 1}])
+
+
+def downgrade():
+    op.drop_table('revisions')
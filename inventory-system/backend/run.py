@@ -2,19 +2,41 @@
 """
 Inventory System - Flask Application Runner
 Phase 1: Foundation
+
+    python run.py              Flask development server
+    python run.py serve        Production server (gunicorn, multi-worker)
+    python run.py serve-api    Async read API for the picker and search lookups
+
+All of them apply pending database migrations first; set DB_MIGRATE_ON_START=0
+when `flask db upgrade` runs as a separate deploy step.
 """
 
 import os
+import sys
 from app import create_app
-from app.models import db
 
-app = create_app()
+app = create_app(migrations=False)
 
 if __name__ == '__main__':
-    with app.app_context():
-        # Create all database tables
-        db.create_all()
-        print("Database tables created successfully!")
+    if os.getenv('DB_MIGRATE_ON_START', '1') != '0':
+        from app.schema import upgrade_database
+        upgrade_database(app)
+        print("Database schema is up to date")
+    
+    if sys.argv[1:] == ['serve-api']:
+        from app.serving import serve_api, api_options
+        settings = api_options()
+        print(f"Starting async read API on {settings['bind']} ({settings['workers']} workers)")
+        serve_api()
+        sys.exit(0)
+    
+    if sys.argv[1:] == ['serve']:
+        from app.serving import serve, options
+        settings = options()
+        print(f"Starting production server on {settings['bind']} "
+              f"({settings['workers']} workers x {settings['threads']} threads)")
+        serve(app)
+        sys.exit(0)
     
     # Run the application
     port = int(os.getenv('PORT', 5000))
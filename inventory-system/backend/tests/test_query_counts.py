@@ -0,0 +1,130 @@
+"""
+Statements per request must not grow with the data.
+
+Every endpoint below is requested once against a small and once against a
+larger SQLite database, counting the statements it sends with a
+before_cursor_execute listener. A lazy load creeping back into a template
+or a to_dict() shows up as a higher count on the larger database.
+"""
+
+import os
+import pytest
+from sqlalchemy import event, func, select
+from app import create_app
+from app.models import db, Module, Level, Location, Item, ItemLocation
+from app.schema import upgrade_database
+from app.services import dashboard
+from app.services.grid import create_locations_for_level
+
+# The repository's frontend/, which docker-compose mounts at backend/frontend
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'frontend')
+
+# modules, levels per module, grid rows and columns, items
+SIZES = {
+    'small': (1, 1, 2, 2, 3),
+    'large': (3, 3, 4, 5, 60),
+}
+
+ENDPOINTS = [
+    # Dashboard and search
+    '/',
+    '/api/stats',
+    '/search/?q=bolt',
+    # Lists
+    '/items/',
+    '/items/?search=bolt',
+    '/items/?category=fasteners',
+    '/locations/',
+    '/modules/',
+    # Views
+    '/items/{item}',
+    '/locations/{location}',
+    '/modules/{module}',
+    '/modules/levels/{level}',
+    # JSON API
+    '/items/api/items',
+    '/items/api/facets',
+    '/items/api/items/{item}',
+    '/locations/api/locations',
+    '/locations/api/locations/{location}',
+    '/modules/api/modules',
+    '/modules/api/modules/{module}',
+    '/modules/api/modules/{module}/levels',
+    '/modules/api/levels/{level}/grid',
+    '/search/api?q=bolt',
+    '/api/hierarchy',
+]
+
+
+def populate(modules, levels, rows, columns, items):
+    for m in range(1, modules + 1):
+        module = Module(name=f'Cabinet {m}')
+        db.session.add(module)
+        db.session.flush()
+        for number in range(1, levels + 1):
+            level = Level(module_id=module.id, level_number=number, rows=rows, columns=columns)
+            db.session.add(level)
+            db.session.flush()
+            create_locations_for_level(level)
+    db.session.commit()
+
+    location_ids = db.session.scalars(select(Location.id).order_by(Location.id)).all()
+    for i in range(items):
+        item = Item(
+            name=f'M{i % 8 + 2} hex bolt {i}',
+            description=f'Stainless hex bolt, {10 + i} mm long',
+            category='fasteners' if i % 2 else 'hardware',
+            item_type='bulk',
+            tags='metric, stainless, bolt',
+            item_metadata={'length_mm': 10 + i},
+        )
+        db.session.add(item)
+        db.session.flush()
+        # Up to two placements per item, spread over the grids
+        for location_id in {location_ids[i % len(location_ids)], location_ids[i * 7 % len(location_ids)]}:
+            db.session.add(ItemLocation(item_id=item.id, location_id=location_id))
+    db.session.commit()
+
+
+def count_statements(database_path, size, monkeypatch):
+    """Statements sent by the first request to each endpoint"""
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{database_path}')
+    monkeypatch.setenv('METRICS_ENABLED', '0')
+    monkeypatch.setenv('FRONTEND_DIR', FRONTEND_DIR)
+    app = create_app(migrations=False)
+    upgrade_database(app)
+
+    statements = []
+    with app.app_context():
+        populate(*size)
+        ids = {
+            'item': db.session.scalar(select(func.min(Item.id))),
+            'location': db.session.scalar(select(func.min(ItemLocation.location_id))),
+            'module': db.session.scalar(select(func.min(Module.id))),
+            'level': db.session.scalar(select(func.min(Level.id))),
+        }
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    client = app.test_client()
+    counts = {}
+    for endpoint in ENDPOINTS:
+        dashboard.cache.clear()  # shared by / and /api/stats
+        del statements[:]
+        response = client.get(endpoint.format(**ids))
+        assert response.status_code == 200, endpoint
+        counts[endpoint] = len(statements)
+    return counts
+
+
+@pytest.fixture(scope='module')
+def counts(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        return {
+            name: count_statements(tmp_path_factory.mktemp(name) / 'inventory.db', size, monkeypatch)
+            for name, size in SIZES.items()
+        }
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_statements_do_not_grow_with_data(counts, endpoint):
+    assert counts['large'][endpoint] == counts['small'][endpoint]
@@ -17,56 +17,190 @@ function confirmDelete(message) {
     return confirm(message || 'Are you sure you want to delete this item?');
 }
 
-// Dynamic location selector
-// This can be expanded in future phases for smarter location suggestions
-function initLocationSelector() {
+// Storage hierarchy for the location picker, kept in localStorage and
+// revalidated with one small request per page (see /api/hierarchy)
+const HIERARCHY_KEY = 'inventory.hierarchy';
+
+async function loadHierarchy() {
+    let cached = null;
+    try {
+        cached = JSON.parse(localStorage.getItem(HIERARCHY_KEY));
+    } catch (e) {
+        cached = null;
+    }
+    
+    const url = cached ? `/api/hierarchy?since=${cached.revision}` : '/api/hierarchy';
+    const data = await (await fetch(url)).json();
+    if (data.changed === false) return cached;
+    
+    try {
+        localStorage.setItem(HIERARCHY_KEY, JSON.stringify(data));
+    } catch (e) {
+        // Over quota: the tree is still used for this page
+    }
+    return data;
+}
+
+// Occupancy bit i of a base64 bitmap (most significant bit first)
+function bitmapReader(encoded) {
+    const bytes = atob(encoded);
+    return i => (bytes.charCodeAt(i >> 3) >> (7 - (i & 7))) & 1;
+}
+
+function fillSelect(select, placeholder, options) {
+    select.innerHTML = `<option value="">${placeholder}</option>`;
+    options.forEach(([value, text]) => {
+        const option = document.createElement('option');
+        option.value = value;
+        option.textContent = text;
+        select.appendChild(option);
+    });
+}
+
+// Dynamic location selector: module -> level -> location, with no requests
+// after the hierarchy is loaded
+async function initLocationSelector() {
     const moduleSelect = document.getElementById('module_select');
     const levelSelect = document.getElementById('level_select');
     const locationSelect = document.getElementById('location_select');
     
     if (!moduleSelect || !levelSelect || !locationSelect) return;
     
-    moduleSelect.addEventListener('change', async function() {
-        const moduleId = this.value;
-        if (!moduleId) {
-            levelSelect.innerHTML = '<option value="">Select level...</option>';
-            locationSelect.innerHTML = '<option value="">Select location...</option>';
+    const tree = await loadHierarchy();
+    const {modules, levels, locations} = tree;
+    const occupied = bitmapReader(locations.occupied);
+    const range = n => Array.from({length: n}, (_, i) => i);
+    const locationPlaceholder = locationSelect.options[0].textContent;
+    // Index of the run (of offsets) holding child i
+    const parentOf = (offsets, i) => offsets.findIndex((start, p) => i < offsets[p + 1] && i >= start);
+    
+    function showLevels(m) {
+        fillSelect(locationSelect, locationPlaceholder, []);
+        if (m === '') {
+            fillSelect(levelSelect, 'Select level...', []);
             return;
         }
         
-        // Fetch levels for selected module
-        const response = await fetch(`/modules/api/modules/${moduleId}/levels`);
-        const levels = await response.json();
-        
-        levelSelect.innerHTML = '<option value="">Select level...</option>';
-        levels.forEach(level => {
-            const option = document.createElement('option');
-            option.value = level.id;
-            option.textContent = `Level ${level.level_number}${level.name ? ' - ' + level.name : ''}`;
-            levelSelect.appendChild(option);
-        });
+        const first = modules.levels[m];
+        fillSelect(levelSelect, 'Select level...', range(modules.levels[m + 1] - first).map(offset => {
+            const l = first + offset;
+            const name = levels.name[l] ? ' - ' + levels.name[l] : '';
+            return [l, `Level ${levels.number[l]}${name}`];
+        }));
+    }
+    
+    function showLocations(l) {
+        if (l === '') {
+            fillSelect(locationSelect, locationPlaceholder, []);
+            return;
+        }
         
-        locationSelect.innerHTML = '<option value="">Select location...</option>';
+        const m = Number(moduleSelect.value);
+        const prefix = `${modules.name[m]}:${levels.number[l]}:`;
+        const first = levels.locations[l];
+        fillSelect(locationSelect, locationPlaceholder, range(levels.locations[l + 1] - first).map(offset => {
+            const i = first + offset;
+            return [locations.id[i], prefix + locations.label[i] + (occupied(i) ? ' (Occupied)' : '')];
+        }));
+    }
+    
+    // Select a location by id, e.g. a suggestion or the location of a resubmitted form
+    locationSelect.selectLocation = function(id) {
+        const i = locations.id.indexOf(Number(id));
+        if (i < 0) return;
+        const l = parentOf(levels.locations, i);
+        const m = parentOf(modules.levels, l);
+        moduleSelect.value = m;
+        showLevels(m);
+        levelSelect.value = l;
+        showLocations(l);
+        locationSelect.value = locations.id[i];
+    };
+    
+    fillSelect(moduleSelect, 'Select module...', modules.id.map((id, i) => [i, modules.name[i]]));
+    moduleSelect.addEventListener('change', function() {
+        showLevels(this.value === '' ? '' : Number(this.value));
+    });
+    levelSelect.addEventListener('change', function() {
+        showLocations(this.value === '' ? '' : Number(this.value));
     });
     
-    levelSelect.addEventListener('change', async function() {
-        const levelId = this.value;
-        if (!levelId) {
-            locationSelect.innerHTML = '<option value="">Select location...</option>';
+    if (locationSelect.dataset.selected) {
+        locationSelect.selectLocation(locationSelect.dataset.selected);
+    }
+}
+
+// Search-as-you-type suggestions
+function initSearchSuggest() {
+    const input = document.getElementById('search_input');
+    const list = document.getElementById('search_suggestions');
+    
+    if (!input || !list) return;
+    
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const q = this.value.trim();
+        if (!q) {
+            list.innerHTML = '';
             return;
         }
         
-        // Fetch locations for selected level
-        const response = await fetch(`/locations/api/locations?level_id=${levelId}`);
-        const locations = await response.json();
+        timer = setTimeout(async () => {
+            const response = await fetch(`/search/api/suggest?q=${encodeURIComponent(q)}`);
+            const data = await response.json();
+            
+            list.innerHTML = '';
+            data.results.forEach(([id, name, address]) => {
+                const option = document.createElement('option');
+                option.value = name;
+                option.label = address || 'No location';
+                list.appendChild(option);
+            });
+        }, 120);
+    });
+}
+
+// Storage location suggestions on the new item form
+function initLocationSuggest() {
+    const button = document.getElementById('suggest_location');
+    const list = document.getElementById('location_suggestions');
+    const locationSelect = document.getElementById('location_select');
+    
+    if (!button || !list || !locationSelect) return;
+    
+    list.addEventListener('click', function(event) {
+        const link = event.target.closest('a[data-location-id]');
+        if (!link) return;
+        event.preventDefault();
+        if (locationSelect.selectLocation) locationSelect.selectLocation(link.dataset.locationId);
+    });
+    
+    button.addEventListener('click', async function() {
+        const params = new URLSearchParams({
+            category: document.getElementById('category').value,
+            item_type: document.getElementById('item_type').value,
+            limit: 5,
+        });
+        const response = await fetch(`/locations/api/suggest?${params}`);
+        const data = await response.json();
         
-        locationSelect.innerHTML = '<option value="">Select location...</option>';
-        locations.forEach(location => {
-            const option = document.createElement('option');
-            option.value = location.id;
-            const occupied = location.item_count > 0 ? ' (Occupied)' : '';
-            option.textContent = `${location.full_address}${occupied}`;
-            locationSelect.appendChild(option);
+        list.innerHTML = '';
+        if (!data.suggestions.length) {
+            list.innerHTML = '<li>No suitable location found</li>';
+            return;
+        }
+        data.suggestions.forEach(suggestion => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.href = '#';
+            link.dataset.locationId = suggestion.location_id;
+            link.textContent = suggestion.address;
+            const details = document.createElement('small');
+            details.textContent = ` ${suggestion.location_type}` +
+                (suggestion.item_count ? `, ${suggestion.item_count} item(s)` : '');
+            item.append(link, details);
+            list.appendChild(item);
         });
     });
 }
@@ -74,4 +208,6 @@ function initLocationSelector() {
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
     initLocationSelector();
+    initSearchSuggest();
+    initLocationSuggest();
 });